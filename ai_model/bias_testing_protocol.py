@@ -5,9 +5,13 @@ Test multiple nevus images to confirm bias pattern
 """
 
 import os
-import json
 from datetime import datetime
 
+try:
+    from .json_io import write_json
+except ImportError:
+    from json_io import write_json
+
 def create_test_protocol():
     """Create a systematic testing protocol for nevus bias analysis"""
     
@@ -65,8 +69,7 @@ def create_test_protocol():
     }
     
     # Save protocol
-    with open('bias_testing_protocol.json', 'w') as f:
-        json.dump(protocol, f, indent=2)
+    write_json('bias_testing_protocol.json', protocol)
     
     print("🔬 BIAS TESTING PROTOCOL CREATED")
     print("=" * 50)
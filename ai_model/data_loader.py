@@ -1,38 +1,186 @@
 import os
 import numpy as np
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from sklearn.model_selection import train_test_split
-from sklearn.utils.class_weight import compute_class_weight
-from tensorflow.keras.utils import to_categorical
 import cv2
 
 # Import with error handling for both relative and absolute imports
 try:
-    from .preprocess import preprocess_image, augment_image
+    from .preprocess import preprocess_image, normalize_image, PREPROCESS_VERSION, JPEG_DECODER
 except ImportError:
-    from ai_model.preprocess import preprocess_image, augment_image
+    from ai_model.preprocess import preprocess_image, normalize_image, PREPROCESS_VERSION, JPEG_DECODER
 
-def load_dataset(data_dir, img_size=(224, 224), test_size=0.2, validation_size=0.2, augment=True, max_samples_per_class=None):
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+CLASSES = ['benign', 'malignant']  # Binary classification
+
+def _load_one(task):
     """
-    Load dataset from directory structured as:
-    data_dir/
-        benign/
-            img1.jpg
-            img2.jpg
-        malignant/
-            img3.jpg
-            ...
+    Decode a single image to uint8.
     
-    Args:
-        data_dir: Path to processed dataset
-        img_size: Target image size
-        test_size: Fraction for test set
-        validation_size: Fraction of training set for validation
-        augment: Whether to apply data augmentation
-        max_samples_per_class: Maximum samples per class (for development)
+    Returns: (image, error)
+    """
+    img_path, img_size = task
+    try:
+        return preprocess_image(img_path, size=img_size, normalize=False), None
+    except Exception as e:
+        return None, str(e)
+
+def _decode_images(tasks, num_workers=None):
+    """
+    Yield _load_one results in task order, in parallel unless num_workers == 1.
     
-    Returns: (X_train, X_val, X_test, y_train, y_val, y_test, class_map, class_weights)
+    Decoding, inpainting, CLAHE and resizing all run inside OpenCV, which
+    releases the GIL, so threads parallelize them without the worker
+    start-up and result pickling of a process pool. The default of
+    2 * cpu_count keeps cores busy while other threads wait on file reads.
+    """
+    if num_workers == 1 or len(tasks) <= 1:
+        yield from map(_load_one, tasks)
+        return
+    
+    # Parallelism is across images; OpenCV's own per-call thread pool on top
+    # would only oversubscribe the cores
+    opencv_threads = cv2.getNumThreads()
+    cv2.setNumThreads(1)
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers or 2 * (os.cpu_count() or 1)) as executor:
+            yield from executor.map(_load_one, tasks)
+    finally:
+        cv2.setNumThreads(opencv_threads)
+
+def _cache_key(class_files, img_size, max_samples_per_class):
+    """
+    Hash everything that determines the decoded pixels: the target size,
+    the sample limit, the preprocessing version, the JPEG decoder and the
+    name/mtime/size of every source file.
+    """
+    h = hashlib.sha1(repr((tuple(img_size), max_samples_per_class, 'uint8', PREPROCESS_VERSION, JPEG_DECODER)).encode())
+    for cls, image_files in class_files.items():
+        for img_path in image_files:
+            st = img_path.stat()
+            h.update(f"{cls}/{img_path.name}:{st.st_mtime_ns}:{st.st_size}".encode())
+    return h.hexdigest()
+
+def _list_class_files(data_dir):
+    """
+    Image DirEntry objects per class directory that exists, sorted by name
+    so splits do not depend on filesystem listing order.
+    """
+    class_files = {}
+    for cls in CLASSES:
+        class_dir = data_dir / cls
+        if not class_dir.exists():
+            continue
+        
+        # One directory pass; DirEntry carries the name and cached stat info
+        with os.scandir(class_dir) as entries:
+            class_files[cls] = sorted(
+                (e for e in entries
+                 if os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS and e.is_file()),
+                key=lambda e: e.name
+            )
+    return class_files
+
+def dataset_fingerprint(data_dir, img_size=(224, 224)):
+    """
+    Fingerprint of the decoded pixels of every image under data_dir (same
+    inputs as the decode cache key), stored in tfrecords.json so stale
+    shards can be detected.
+    """
+    return _cache_key(_list_class_files(Path(data_dir)), img_size, None)
+
+def _read_cache(cache_path, meta_path, key):
+    """
+    Return (X, y, filenames) from a valid cache, or None on a miss.
+    X is memory-mapped read-only so pages are only loaded when touched.
+    """
+    if not cache_path.exists() or not meta_path.exists():
+        return None
+    
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('key') != key:
+            return None
+        
+        X = np.load(cache_path, mmap_mode='r')[:meta['count']]
+        return X, np.array(meta['labels'], dtype="int"), meta['filenames']
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Ignoring unreadable cache {cache_path}: {e}")
+        return None
+
+def _decode_dataset(class_files, class_map, img_size, num_workers=None, cache_path=None):
+    """
+    Decode every image across all classes in one parallel pass, writing
+    straight into a preallocated array (an on-disk memmap at cache_path
+    when one is given).
+    
+    Returns: (X, y, filenames)
+    """
+    tasks = [
+        (img_path.path, img_size)
+        for image_files in class_files.values()
+        for img_path in image_files
+    ]
+    shape = (len(tasks), img_size[1], img_size[0], 3)
+    
+    # Preallocate and write in place - no list of arrays and no final copy
+    if cache_path is not None:
+        X = np.lib.format.open_memmap(cache_path, mode='w+', dtype=np.uint8, shape=shape)
+    else:
+        X = np.empty(shape, dtype=np.uint8)
+    y = np.empty(len(tasks), dtype="int")
+    filenames = []
+    
+    results = _decode_images(tasks, num_workers)
+    n = 0
+    for cls, image_files in class_files.items():
+        for img_path in image_files:
+            image, error = next(results)
+            if error is not None:
+                print(f"    ❌ Skipping {img_path.name}: {error}")
+                continue
+            
+            X[n] = image
+            y[n] = class_map[cls]
+            filenames.append(img_path.name)
+            n += 1
+    
+    if cache_path is not None:
+        X.flush()
+    
+    # Trim rows left unused by skipped files
+    return X[:n], y[:n], filenames
+
+def _one_hot(y, num_classes):
+    """One-hot encode integer labels as float32 (same as keras to_categorical)."""
+    one_hot = np.zeros((y.size, num_classes), dtype=np.float32)
+    one_hot[np.arange(y.size), y] = 1.0
+    return one_hot
+
+def _balanced_class_weights(y):
+    """
+    'balanced' class weights, n_samples / (n_classes * count), for the
+    classes present in y (same as sklearn's compute_class_weight).
+    """
+    counts = np.bincount(y)
+    present = np.flatnonzero(counts)
+    weights = y.size / (present.size * counts[present])
+    return {int(cls): float(w) for cls, w in zip(present, weights)}
+
+def load_dataset_splits(data_dir, img_size=(224, 224), test_size=0.2, validation_size=0.2, max_samples_per_class=None, num_workers=None, use_cache=True, return_paths=False):
+    """
+    Decode (or load from cache) every image and compute stratified splits
+    without materializing the split arrays.
+    
+    X is the uint8 image array - a read-only memmap of the on-disk cache when
+    use_cache is on, so memory use stays constant regardless of dataset size.
+    
+    Returns: (X, y, (train_idx, val_idx, test_idx), class_map, class_weights)
+        where y holds one-hot labels for every row of X. With return_paths=True
+        a list with the source image path of every row of X is appended.
     """
     print(f"🔄 Loading dataset from {data_dir}")
     
@@ -40,23 +188,18 @@ def load_dataset(data_dir, img_size=(224, 224), test_size=0.2, validation_size=0
     if not data_dir.exists():
         raise ValueError(f"Dataset directory not found: {data_dir}")
     
-    X, y, filenames = [], [], []
-    classes = ['benign', 'malignant']  # Binary classification
+    classes = CLASSES
     class_map = {cls: idx for idx, cls in enumerate(classes)}
     
     print(f"📁 Classes: {class_map}")
     
+    class_files = _list_class_files(data_dir)
     for cls in classes:
-        class_dir = data_dir / cls
-        if not class_dir.exists():
-            print(f"⚠️ Class directory not found: {class_dir}")
+        if cls not in class_files:
+            print(f"⚠️ Class directory not found: {data_dir / cls}")
             continue
-            
-        # Get all image files
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.bmp']:
-            image_files.extend(list(class_dir.glob(ext)))
         
+        image_files = class_files[cls]
         print(f"  📂 {cls}: Found {len(image_files)} images")
         
         # Limit samples if specified (for development)
@@ -64,72 +207,240 @@ def load_dataset(data_dir, img_size=(224, 224), test_size=0.2, validation_size=0
             image_files = image_files[:max_samples_per_class]
             print(f"    🔢 Limited to {len(image_files)} samples")
         
-        loaded_count = 0
-        for img_path in image_files:
-            try:
-                image = preprocess_image(str(img_path), size=img_size)
-                X.append(image)
-                y.append(class_map[cls])
-                filenames.append(img_path.name)
-                loaded_count += 1
-                
-                # Data augmentation for training data
-                if augment and cls == 'malignant':  # Augment minority class more
-                    aug_image = augment_image(image)
-                    X.append(aug_image)
-                    y.append(class_map[cls])
-                    filenames.append(f"aug_{img_path.name}")
-                    loaded_count += 1
-                    
-            except Exception as e:
-                print(f"    ❌ Skipping {img_path.name}: {e}")
-        
-        print(f"    ✅ Loaded {loaded_count} images for {cls}")
+        class_files[cls] = image_files
+    
+    # Decoding is deterministic, so reuse the previous run's pixels when nothing changed
+    cache_path = data_dir / f"cache_{img_size[0]}x{img_size[1]}.npy"
+    meta_path = cache_path.with_suffix('.json')
+    key = _cache_key(class_files, img_size, max_samples_per_class)
+    
+    cached = _read_cache(cache_path, meta_path, key) if use_cache else None
+    if cached is not None:
+        X, y, filenames = cached
+        print(f"⚡ Loaded {len(X)} decoded images from cache {cache_path.name}")
+    else:
+        X, y, filenames = _decode_dataset(
+            class_files, class_map, img_size, num_workers,
+            cache_path=cache_path if use_cache else None
+        )
+        if use_cache:
+            with open(meta_path, 'w') as f:
+                json.dump({'key': key, 'count': len(y), 'labels': y.tolist(), 'filenames': filenames}, f)
+    
+    for cls in class_files:
+        print(f"    ✅ Loaded {int(np.sum(y == class_map[cls]))} images for {cls}")
     
     if len(X) == 0:
         raise ValueError("No images loaded! Check dataset structure.")
     
-    X = np.array(X, dtype="float32")
-    y = np.array(y, dtype="int")
-    
     print(f"\n📊 Dataset Statistics:")
     print(f"  Total images: {len(X)}")
     print(f"  Benign: {np.sum(y == 0)} ({np.sum(y == 0)/len(y)*100:.1f}%)")
     print(f"  Malignant: {np.sum(y == 1)} ({np.sum(y == 1)/len(y)*100:.1f}%)")
     print(f"  Image shape: {X[0].shape}")
     
+    # Imported here so preprocessing-only users of this module skip sklearn's ~2 s import
+    from sklearn.model_selection import train_test_split
+    
+    # Split row indices rather than the images themselves
     # First split: separate test set
-    X_temp, X_test, y_temp, y_test = train_test_split(
-        X, y, test_size=test_size, stratify=y, random_state=42
+    temp_idx, test_idx = train_test_split(
+        np.arange(len(y)), test_size=test_size, stratify=y, random_state=42
     )
     
     # Second split: separate train and validation
-    X_train, X_val, y_train, y_val = train_test_split(
-        X_temp, y_temp, test_size=validation_size, stratify=y_temp, random_state=42
+    train_idx, val_idx = train_test_split(
+        temp_idx, test_size=validation_size, stratify=y[temp_idx], random_state=42
     )
     
     print(f"\n📈 Data Splits:")
-    print(f"  Training: {len(X_train)} images")
-    print(f"  Validation: {len(X_val)} images") 
-    print(f"  Test: {len(X_test)} images")
+    print(f"  Training: {len(train_idx)} images")
+    print(f"  Validation: {len(val_idx)} images") 
+    print(f"  Test: {len(test_idx)} images")
     
     # Calculate class weights for imbalanced data
-    class_weights = compute_class_weight(
-        'balanced',
-        classes=np.unique(y_train),
-        y=y_train
-    )
-    class_weight_dict = {i: class_weights[i] for i in range(len(class_weights))}
+    class_weight_dict = _balanced_class_weights(y[train_idx])
     
     print(f"⚖️ Class weights: {class_weight_dict}")
     
     # One-hot encode labels
-    y_train = to_categorical(y_train, num_classes=len(classes))
-    y_val = to_categorical(y_val, num_classes=len(classes))
-    y_test = to_categorical(y_test, num_classes=len(classes))
+    result = (X, _one_hot(y, len(classes)), (train_idx, val_idx, test_idx), class_map, class_weight_dict)
+    if return_paths:
+        paths = [str(data_dir / classes[label] / name) for label, name in zip(y, filenames)]
+        return result + (paths,)
+    return result
+
+def load_dataset(data_dir, img_size=(224, 224), test_size=0.2, validation_size=0.2, max_samples_per_class=None, num_workers=None, use_cache=True, normalize=True):
+    """
+    Load dataset from directory structured as:
+    data_dir/
+        benign/
+            img1.jpg
+            img2.jpg
+        malignant/
+            img3.jpg
+            ...
+    
+    Args:
+        data_dir: Path to processed dataset
+        img_size: Target image size
+        test_size: Fraction for test set
+        validation_size: Fraction of training set for validation
+        max_samples_per_class: Maximum samples per class (for development)
+        num_workers: Decoding threads (None = 2 per core, 1 = serial)
+        use_cache: Reuse/write decoded images in data_dir/cache_<W>x<H>.npy
+        normalize: Return float32 images in [0, 1]; with False the uint8 images
+            are returned as-is (see make_tf_dataset)
+    
+    Returns: (X_train, X_val, X_test, y_train, y_val, y_test, class_map, class_weights)
+    
+    Augmentation is not applied here; use make_tf_dataset(..., augment=True)
+    so each epoch sees fresh variants instead of one frozen copy. For datasets
+    that do not fit in RAM use load_dataset_splits + make_streaming_dataset.
+    """
+    X, y, splits, class_map, class_weight_dict = load_dataset_splits(
+        data_dir, img_size, test_size, validation_size,
+        max_samples_per_class, num_workers, use_cache
+    )
+    
+    X_train, X_val, X_test = (X[idx] for idx in splits)
+    y_train, y_val, y_test = (y[idx] for idx in splits)
+    
+    if normalize:
+        X_train, X_val, X_test = (normalize_image(split) for split in (X_train, X_val, X_test))
     
     return X_train, X_val, X_test, y_train, y_val, y_test, class_map, class_weight_dict
 
+def _finish_pipeline(ds, image_shape, batch_size, augment, dtype='float32'):
+    """
+    Shared tail of the tf.data pipelines: optional minority-class
+    augmentation, batching, uint8 -> [0, 1] floats per batch, prefetch.
+    
+    dtype='bfloat16' or 'float16' halves the bytes per batch handed to the
+    model (the value is rounded once, after scaling in float32). Mixed
+    precision models cast their inputs to that type anyway.
+    """
+    import tensorflow as tf
+    
+    square = image_shape[0] == image_shape[1]
+    
+    def augment_minority(image, label):
+        augmented = tf.image.random_flip_left_right(image)
+        augmented = tf.image.random_flip_up_down(augmented)
+        if square:  # rot90 would change the shape of non-square images
+            augmented = tf.image.rot90(augmented, k=tf.random.uniform([], 0, 4, dtype=tf.int32))
+        augmented = tf.image.random_brightness(augmented, 0.1)  # delta is on the [0, 1] scale
+        augmented = tf.image.random_contrast(augmented, 0.8, 1.2)
+        augmented = tf.image.random_saturation(augmented, 0.8, 1.2)
+        return tf.where(label[1] > 0, augmented, image), label
+    
+    if augment:
+        ds = ds.map(augment_minority, num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.batch(batch_size)
+    ds = ds.map(
+        lambda images, labels: (tf.cast(tf.cast(images, tf.float32) / 255.0, dtype), labels),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+def make_tf_dataset(X, y, batch_size=32, shuffle=False, augment=False, dtype='float32'):
+    """
+    Wrap uint8 images from load_dataset(..., normalize=False) in a tf.data
+    pipeline that casts to float32 and scales to [0, 1] one batch at a time,
+    so only the uint8 pixels are ever held in memory.
+    
+    With augment=True the minority (malignant, one-hot index 1) class gets
+    random flips, rotation and colour jitter on the fly, so every epoch sees
+    new variants and RAM holds only the originals.
+    """
+    import tensorflow as tf
+    
+    ds = tf.data.Dataset.from_tensor_slices((X, y))
+    if shuffle:
+        ds = ds.shuffle(min(len(X), 1024), seed=42)
+    return _finish_pipeline(ds, X.shape[1:], batch_size, augment, dtype)
+
+def make_streaming_dataset(X, y, indices, batch_size=32, shuffle=False, augment=False, dtype='float32'):
+    """
+    Like make_tf_dataset, but reads the rows in indices from X (typically the
+    memmapped cache from load_dataset_splits) on the fly through a generator,
+    so the split is never copied into RAM.
+    """
+    import tensorflow as tf
+    
+    rng = np.random.default_rng(42)
+    
+    def rows():
+        order = rng.permutation(indices) if shuffle else indices
+        for i in order:
+            yield X[i], y[i]
+    
+    ds = tf.data.Dataset.from_generator(
+        rows,
+        output_signature=(
+            tf.TensorSpec(shape=X.shape[1:], dtype=tf.uint8),
+            tf.TensorSpec(shape=y.shape[1:], dtype=tf.float32),
+        )
+    )
+    ds = ds.apply(tf.data.experimental.assert_cardinality(len(indices)))
+    return _finish_pipeline(ds, X.shape[1:], batch_size, augment, dtype)
+
+def load_tfrecord_metadata(tfrecord_dir):
+    """Read the tfrecords.json written by DatasetProcessor.write_tfrecords."""
+    with open(Path(tfrecord_dir) / 'tfrecords.json') as f:
+        meta = json.load(f)
+    meta['class_weights'] = {int(k): v for k, v in meta['class_weights'].items()}
+    return meta
+
+def tfrecords_are_current(tfrecord_dir, data_dir):
+    """
+    True if the shards in tfrecord_dir were written from the images now in
+    data_dir with the current preprocessing version and JPEG decoder.
+    Manifests from before these fields were recorded count as stale.
+    """
+    try:
+        meta = load_tfrecord_metadata(tfrecord_dir)
+        return (
+            meta.get('preprocess_version') == PREPROCESS_VERSION
+            and meta.get('jpeg_decoder') == JPEG_DECODER
+            and meta.get('fingerprint') == dataset_fingerprint(data_dir, meta['img_size'])
+        )
+    except (OSError, ValueError, KeyError):
+        return False
+
+def make_tfrecord_dataset(tfrecord_dir, split='train', batch_size=32, shuffle=False, augment=False, dtype='float32'):
+    """
+    Read one split of the TFRecord shards written by
+    DatasetProcessor.write_tfrecords, reading shards in parallel, and feed
+    it through the same pipeline tail as make_tf_dataset.
+    """
+    import tensorflow as tf
+    
+    tfrecord_dir = Path(tfrecord_dir)
+    meta = load_tfrecord_metadata(tfrecord_dir)
+    width, height = meta['img_size']
+    num_classes = len(meta['class_map'])
+    
+    shards = sorted(str(p) for p in tfrecord_dir.glob(f"{split}-*.tfrecord"))
+    if not shards:
+        raise ValueError(f"No {split} TFRecord shards found in {tfrecord_dir}")
+    
+    features = {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+    }
+    
+    def parse(record):
+        example = tf.io.parse_single_example(record, features)
+        image = tf.reshape(tf.io.decode_raw(example['image'], tf.uint8), (height, width, 3))
+        return image, tf.one_hot(example['label'], num_classes)
+    
+    ds = tf.data.TFRecordDataset(shards, num_parallel_reads=tf.data.AUTOTUNE)
+    ds = ds.map(parse, num_parallel_calls=tf.data.AUTOTUNE)
+    if shuffle:
+        ds = ds.shuffle(1024, seed=42)
+    return _finish_pipeline(ds, (height, width, 3), batch_size, augment, dtype)
+
 if __name__ == "__main__":
     dataset_path = "dataset/processed"  # Example
     X_train, X_test, y_train, y_test, class_map = load_dataset(dataset_path)
@@ -4,18 +4,68 @@ import numpy as np
 import cv2
 from pathlib import Path
 import shutil
+import hashlib
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import json
 
+try:
+    from .json_io import write_json
+except ImportError:
+    from json_io import write_json
+
+try:
+    from blake3 import blake3 as _blake3
+except ImportError:
+    _blake3 = None
+
+COPY_MODES = ('hardlink', 'symlink', 'copy')
+HASH_ALGORITHM = 'blake3' if _blake3 is not None else 'blake2b'
+
+def _file_digest(path):
+    """Content hash of a file: BLAKE3 when installed, else stdlib BLAKE2b."""
+    h = _blake3() if _blake3 is not None else hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _link_or_copy(src, dst, mode='hardlink'):
+    """
+    Place src at dst without duplicating the pixels where possible.
+    Source images are never modified, so a link is as good as a copy.
+    hardlink falls back to symlink (e.g. across filesystems) and both
+    fall back to a real copy.
+    """
+    if mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    if mode in ('hardlink', 'symlink'):
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+
 class DatasetProcessor:
     """
     Comprehensive processor for Fitzpatrick17k, HAM10000, and ISIC datasets
     Handles different formats and creates unified training structure
     """
     
-    def __init__(self, raw_data_dir, processed_data_dir):
+    def __init__(self, raw_data_dir, processed_data_dir, copy_mode='hardlink'):
+        if copy_mode not in COPY_MODES:
+            raise ValueError(f"copy_mode must be one of {COPY_MODES}, got {copy_mode!r}")
+        
         self.raw_data_dir = Path(raw_data_dir)
         self.processed_data_dir = Path(processed_data_dir)
+        self.copy_mode = copy_mode
+        self.seen_path = self.processed_data_dir / 'seen.json'
+        self.seen_hashes = self._load_seen_hashes()
         self.class_mapping = {
             # Malignant classes
             'melanoma': 'malignant',
@@ -70,6 +120,96 @@ class DatasetProcessor:
         
         return stats
     
+    def _load_seen_hashes(self):
+        """
+        Content hashes of images placed in the processed tree, as
+        hash → target path relative to processed_data_dir
+        """
+        try:
+            with open(self.seen_path) as f:
+                seen = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Digests from another hash function can never match
+        if seen.get('algorithm') != HASH_ALGORITHM:
+            return {}
+        return seen.get('hashes', {})
+    
+    def _save_seen_hashes(self):
+        write_json(self.seen_path, {'algorithm': HASH_ALGORITHM, 'hashes': self.seen_hashes}, indent=False)
+    
+    def _already_placed(self, digest):
+        """
+        Whether content with this hash is still in the processed tree;
+        entries whose file was deleted are dropped so it can be placed again
+        """
+        target = self.seen_hashes.get(digest)
+        if target is None:
+            return False
+        if os.path.lexists(self.processed_data_dir / target):
+            return True
+        del self.seen_hashes[digest]
+        return False
+    
+    def _copy_batch(self, jobs, stats, prefix, max_workers=32):
+        """
+        Link/copy (src, dst, target_class, name) jobs on a thread pool - file
+        operations are IO-bound and release the GIL. Targets that already exist
+        are skipped, and so are sources whose content was already placed by
+        this or an earlier dataset (ISIC images reappear in HAM10000).
+        A hash is only recorded once its file is in place; if that copy fails,
+        the next source with the same content is tried instead.
+        """
+        def hash_one(job):
+            try:
+                return _file_digest(job[0])
+            except OSError:
+                return None  # Reported by copy_one
+        
+        def copy_one(job):
+            src, dst, target_class, name = job
+            try:
+                if os.path.lexists(dst):
+                    return target_class, False, None
+                _link_or_copy(src, dst, self.copy_mode)
+                return target_class, True, None
+            except Exception as e:
+                return target_class, False, f"    ❌ Error processing {name}: {e}"
+        
+        pending = [job for job in jobs if not os.path.lexists(job[1])]
+        if not pending:
+            return
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Group same-content jobs in job order, so the first copy of an image wins
+            # (sources that could not be hashed get a group of their own, keyed by index)
+            groups = {}
+            for i, (job, digest) in enumerate(zip(pending, executor.map(hash_one, pending))):
+                if digest is not None and self._already_placed(digest):
+                    stats[f'{prefix}_duplicates'] += 1
+                    continue
+                groups.setdefault(digest if digest is not None else i, []).append(job)
+            
+            attempts = [(key, group.pop(0)) for key, group in groups.items()]
+            while attempts:
+                retries = []
+                results = executor.map(copy_one, [job for _, job in attempts])
+                for (key, job), (target_class, copied, error) in zip(attempts, results):
+                    if error:
+                        print(error)
+                        if groups[key]:
+                            retries.append((key, groups[key].pop(0)))
+                        continue
+                    if copied:
+                        stats[f'{prefix}_{target_class}'] += 1
+                        stats[f'total_{prefix}'] += 1
+                    if isinstance(key, str):
+                        self.seen_hashes[key] = Path(os.path.relpath(job[1], self.processed_data_dir)).as_posix()
+                    stats[f'{prefix}_duplicates'] += len(groups[key])
+                attempts = retries
+        
+        self._save_seen_hashes()
+    
     def process_isic_dataset(self):
         """Process ISIC skin cancer dataset"""
         print("📁 Processing ISIC dataset...")
@@ -81,6 +221,7 @@ class DatasetProcessor:
             print(f"❌ ISIC train directory not found: {isic_train_dir}")
             return stats
             
+        jobs = []
         for class_dir in isic_train_dir.iterdir():
             if not class_dir.is_dir():
                 continue
@@ -93,18 +234,11 @@ class DatasetProcessor:
             target_dir = self.processed_data_dir / target_class
             
             for img_path in class_dir.glob('*.jpg'):
-                try:
-                    # Copy image to target directory with ISIC prefix
-                    new_name = f"ISIC_{class_name.replace(' ', '_')}_{img_path.name}"
-                    target_path = target_dir / new_name
-                    
-                    if not target_path.exists():
-                        shutil.copy2(img_path, target_path)
-                        stats[f'isic_{target_class}'] += 1
-                        stats['total_isic'] += 1
-                        
-                except Exception as e:
-                    print(f"    ❌ Error processing {img_path.name}: {e}")
+                # Copy image to target directory with ISIC prefix
+                new_name = f"ISIC_{class_name.replace(' ', '_')}_{img_path.name}"
+                jobs.append((img_path, target_dir / new_name, target_class, img_path.name))
+        
+        self._copy_batch(jobs, stats, 'isic')
                     
         return stats
     
@@ -125,35 +259,27 @@ class DatasetProcessor:
             df = pd.read_csv(metadata_path)
             print(f"  📊 Found {len(df)} HAM10000 entries")
             
-            for _, row in df.iterrows():
-                image_id = row['image_id']
-                dx = row['dx']  # diagnosis
-                
-                target_class = self.class_mapping.get(dx, 'benign')
-                
-                # Find image file
-                img_path = None
-                for img_dir in [img_dir1, img_dir2]:
-                    potential_path = img_dir / f"{image_id}.jpg"
-                    if potential_path.exists():
-                        img_path = potential_path
-                        break
-                
-                if img_path and img_path.exists():
-                    try:
-                        target_dir = self.processed_data_dir / target_class
-                        new_name = f"HAM_{dx}_{image_id}.jpg"
-                        target_path = target_dir / new_name
-                        
-                        if not target_path.exists():
-                            shutil.copy2(img_path, target_path)
-                            stats[f'ham_{target_class}'] += 1
-                            stats['total_ham'] += 1
-                            
-                    except Exception as e:
-                        print(f"    ❌ Error processing {image_id}: {e}")
-                else:
-                    stats['ham_missing'] += 1
+            # One directory listing per image folder instead of a stat per row
+            part1 = set(os.listdir(img_dir1)) if img_dir1.exists() else set()
+            part2 = set(os.listdir(img_dir2)) if img_dir2.exists() else set()
+            
+            image_ids = df['image_id'].astype(str)
+            dx = df['dx'].astype(str)  # diagnosis
+            file_names = image_ids + '.jpg'
+            in_part1 = file_names.isin(part1)
+            found = in_part1 | file_names.isin(part2)
+            stats['ham_missing'] += int((~found).sum())
+            
+            src = np.where(in_part1, str(img_dir1) + os.sep + file_names, str(img_dir2) + os.sep + file_names)
+            target_class = df['dx'].map(self.class_mapping).fillna('benign')
+            dst = str(self.processed_data_dir) + os.sep + target_class + os.sep + 'HAM_' + dx + '_' + file_names
+            
+            found = found.to_numpy()
+            jobs = list(zip(
+                src[found], dst[found].to_numpy(),
+                target_class[found].to_numpy(), image_ids[found].to_numpy()
+            ))
+            self._copy_batch(jobs, stats, 'ham')
                     
         except Exception as e:
             print(f"❌ Error processing HAM10000: {e}")
@@ -180,46 +306,53 @@ class DatasetProcessor:
             df = pd.read_csv(metadata_path)
             print(f"  📊 Found {len(df)} Fitzpatrick17k entries")
             
-            for _, row in df.iterrows():
-                md5hash = row['md5hash']
-                label = row['label']
-                three_partition_label = row['three_partition_label']
-                
+            # Index the image folder once by md5 prefix instead of globbing it per row
+            images_by_md5 = {}
+            for name in sorted(os.listdir(img_dir)):
+                images_by_md5.setdefault(os.path.splitext(name)[0][:32], img_dir / name)
+            
+            jobs = []
+            for md5hash, label, three_partition_label in zip(
+                df['md5hash'].to_numpy(), df['label'].to_numpy(), df['three_partition_label'].to_numpy()
+            ):
                 # Use three_partition_label for classification
                 target_class = self.class_mapping.get(three_partition_label, 'benign')
                 
                 # Find image file by md5 hash
-                img_files = list(img_dir.glob(f"{md5hash}*"))
+                img_path = images_by_md5.get(md5hash)
                 
-                if img_files:
-                    img_path = img_files[0]
+                if img_path is not None:
                     try:
                         target_dir = self.processed_data_dir / target_class
                         new_name = f"FITZ_{label.replace(' ', '_')}_{md5hash}{img_path.suffix}"
-                        target_path = target_dir / new_name
-                        
-                        if not target_path.exists():
-                            shutil.copy2(img_path, target_path)
-                            stats[f'fitz_{target_class}'] += 1
-                            stats['total_fitz'] += 1
-                            
+                        jobs.append((img_path, target_dir / new_name, target_class, md5hash))
                     except Exception as e:
+                        # A bad row (e.g. a non-string label) is skipped, not the whole dataset
                         print(f"    ❌ Error processing {md5hash}: {e}")
                 else:
                     stats['fitz_missing'] += 1
+            
+            self._copy_batch(jobs, stats, 'fitz')
                     
         except Exception as e:
             print(f"❌ Error processing Fitzpatrick17k: {e}")
             
         return stats
     
+    @staticmethod
+    def _count_files(directory):
+        """Count files in directory without building a list of paths"""
+        with os.scandir(directory) as entries:
+            return sum(1 for entry in entries if entry.is_file())
+    
     def save_processing_stats(self, stats):
         """Save processing statistics"""
         stats_file = self.processed_data_dir / 'processing_stats.json'
         
-        # Count final images
-        benign_count = len(list((self.processed_data_dir / 'benign').glob('*')))
-        malignant_count = len(list((self.processed_data_dir / 'malignant').glob('*')))
+        # Count final images from the directories - stats only covers files
+        # placed by this run, not ones kept from earlier runs
+        benign_count = self._count_files(self.processed_data_dir / 'benign')
+        malignant_count = self._count_files(self.processed_data_dir / 'malignant')
         
         final_stats = {
             'processing_stats': dict(stats),
@@ -234,8 +367,7 @@ class DatasetProcessor:
             }
         }
         
-        with open(stats_file, 'w') as f:
-            json.dump(final_stats, f, indent=2)
+        write_json(stats_file, final_stats)
             
         print(f"\n📊 DATASET PROCESSING COMPLETE")
         print(f"📁 Benign images: {benign_count}")
@@ -243,13 +375,80 @@ class DatasetProcessor:
         print(f"📈 Total images: {benign_count + malignant_count}")
         print(f"⚖️ Balance: {final_stats['class_balance']['benign_percentage']:.1f}% benign, {final_stats['class_balance']['malignant_percentage']:.1f}% malignant")
         print(f"💾 Stats saved to: {stats_file}")
+    
+    def write_tfrecords(self, out_dir=None, img_size=(224, 224), shard_size=2048, test_size=0.15, validation_size=0.15):
+        """
+        Pack the processed dataset into train/val/test TFRecord shards of
+        preprocessed uint8 pixels, so training reads a few large sequential
+        files instead of opening every image each epoch.
+        Read them back with data_loader.make_tfrecord_dataset.
+        """
+        import tensorflow as tf
+        try:
+            from .data_loader import load_dataset_splits, dataset_fingerprint, PREPROCESS_VERSION, JPEG_DECODER
+        except ImportError:
+            from ai_model.data_loader import load_dataset_splits, dataset_fingerprint, PREPROCESS_VERSION, JPEG_DECODER
+        
+        out_dir = Path(out_dir) if out_dir else self.processed_data_dir / 'tfrecords'
+        out_dir.mkdir(parents=True, exist_ok=True)
+        print(f"📦 Writing TFRecord shards to {out_dir}")
+        
+        fingerprint = dataset_fingerprint(self.processed_data_dir, img_size)
+        X, y, splits, class_map, class_weights = load_dataset_splits(
+            self.processed_data_dir, img_size, test_size, validation_size
+        )
+        labels = y.argmax(axis=1)
+        
+        counts = {}
+        for split_name, indices in zip(['train', 'val', 'test'], splits):
+            # Remove shards from a previous, possibly larger, run
+            for old_shard in out_dir.glob(f"{split_name}-*.tfrecord"):
+                old_shard.unlink()
+            
+            for shard, start in enumerate(range(0, len(indices), shard_size)):
+                shard_path = out_dir / f"{split_name}-{shard:04d}.tfrecord"
+                with tf.io.TFRecordWriter(str(shard_path)) as writer:
+                    for i in indices[start:start + shard_size]:
+                        example = tf.train.Example(features=tf.train.Features(feature={
+                            'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[X[i].tobytes()])),
+                            'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[int(labels[i])])),
+                        }))
+                        writer.write(example.SerializeToString())
+            
+            counts[split_name] = len(indices)
+            print(f"  ✅ {split_name}: {len(indices)} images")
+        
+        write_json(out_dir / 'tfrecords.json', {
+            'img_size': list(img_size),
+            'class_map': class_map,
+            'class_weights': class_weights,
+            'counts': counts,
+            # Checked by data_loader.tfrecords_are_current before training uses the shards
+            'preprocess_version': PREPROCESS_VERSION,
+            'jpeg_decoder': JPEG_DECODER,
+            'fingerprint': fingerprint
+        })
+        
+        return out_dir
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build dataset/processed from the raw datasets")
+    parser.add_argument('--copy-mode', choices=COPY_MODES, default='hardlink',
+                        help="How images are placed in the processed tree (default: hardlink)")
+    parser.add_argument('--tfrecords', action='store_true',
+                        help="Also pack the processed images into TFRecord shards")
+    args = parser.parse_args()
+    
     # Run dataset processing
     processor = DatasetProcessor(
         raw_data_dir="dataset/raw",
-        processed_data_dir="dataset/processed"
+        processed_data_dir="dataset/processed",
+        copy_mode=args.copy_mode
     )
     
     stats = processor.process_all_datasets()
+    if args.tfrecords:
+        processor.write_tfrecords()
     print("\n✅ Dataset processing completed!")
\ No newline at end of file
@@ -1,15 +1,19 @@
 import tensorflow as tf
 from sklearn.metrics import classification_report
-from .data_loader import load_dataset
+from .data_loader import load_dataset_splits, make_streaming_dataset
 
 if __name__ == "__main__":
     model = tf.keras.models.load_model("ai_model/saved_models/skin_lesion_cnn.h5")
 
     dataset_path = "dataset/processed"
-    _, X_test, _, y_test, class_map = load_dataset(dataset_path)
+    # Same split as train.py; test images are streamed from the memmapped cache in batches
+    X, y, (_, _, test_idx), class_map, _ = load_dataset_splits(
+        dataset_path, test_size=0.15, validation_size=0.15
+    )
+    test_ds = make_streaming_dataset(X, y, test_idx, batch_size=64)
 
-    y_pred = model.predict(X_test)
+    y_pred = model.predict(test_ds)
     y_pred_classes = y_pred.argmax(axis=1)
-    y_true_classes = y_test.argmax(axis=1)
+    y_true_classes = y[test_idx].argmax(axis=1)
 
     print(classification_report(y_true_classes, y_pred_classes, target_names=class_map.keys()))
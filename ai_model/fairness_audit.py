@@ -1,120 +1,194 @@
-import tensorflow as tf
 import numpy as np
 import pandas as pd
-from sklearn.metrics import confusion_matrix, classification_report
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-import matplotlib.pyplot as plt
-import seaborn as sns
-from .data_loader import load_dataset
-from aif360.metrics import BinaryLabelDatasetMetric, ClassificationMetric
-from aif360.datasets import BinaryLabelDataset
+from .data_loader import load_dataset_splits, make_tf_dataset, make_streaming_dataset
 import cv2
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Results table falls back to CSV
+    pa = None
+    pq = None
+
 
 class SkinToneClassifier:
     """Classify skin tone using the Fitzpatrick scale or simplified categories"""
     
-    @staticmethod
-    def classify_skin_tone_simple(image_path: str) -> str:
-        """
-        Simple skin tone classification based on average skin color
-        Returns: 'light', 'medium', 'dark'
-        """
+    # Skin color range in HSV
+    LOWER_SKIN = np.array([0, 20, 70], dtype=np.uint8)
+    UPPER_SKIN = np.array([20, 255, 255], dtype=np.uint8)
+    
+    # Grayscale weights in BGR order (same as cv2.COLOR_BGR2GRAY)
+    BRIGHTNESS_COEF = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    
+    # Brightness thresholds: <= 120 dark, <= 180 medium, above that light
+    BRIGHTNESS_BINS = [120, 180]
+    TONE_LABELS = np.array(['dark', 'medium', 'light'])
+    
+    # Average skin brightness hardly depends on resolution, so let libjpeg
+    # decode at half size (DCT-domain scaling) - a quarter of the pixels to
+    # decode, convert and mask
+    IMREAD_FLAGS = cv2.IMREAD_REDUCED_COLOR_2
+    
+    @classmethod
+    def _skin_brightness(cls, image: np.ndarray) -> float:
+        """Average brightness of the skin pixels of a BGR image, or NaN if there are none"""
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        skin_mask = cv2.inRange(hsv, cls.LOWER_SKIN, cls.UPPER_SKIN)
+        
+        # Grayscale is linear in B, G, R, so the mean gray level is the
+        # weighted mean colour - one masked reduction, no copy of the pixels.
+        # (HSV's V channel would avoid even this, but it is max(B, G, R)
+        # rather than luma and the thresholds are calibrated for luma.)
+        mean_bgr = np.array(cv2.mean(image, mask=skin_mask)[:3], dtype=np.float32)
+        
+        # Skin pixels have V = max(B, G, R) >= 70, so an all-zero mean can only
+        # come from an empty mask - no separate countNonZero pass needed
+        if not mean_bgr.any():
+            return np.nan
+        return float(mean_bgr @ cls.BRIGHTNESS_COEF)
+    
+    @classmethod
+    def _image_brightness(cls, image_path: str) -> float:
+        """Skin brightness of the image at image_path, or NaN if it cannot be measured"""
         try:
-            image = cv2.imread(image_path)
+            image = cv2.imread(image_path, cls.IMREAD_FLAGS)
             if image is None:
-                return 'unknown'
-            
-            # Convert to HSV for better skin detection
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            
-            # Define skin color range in HSV
-            lower_skin = np.array([0, 20, 70], dtype=np.uint8)
-            upper_skin = np.array([20, 255, 255], dtype=np.uint8)
-            
-            # Create mask for skin pixels
-            skin_mask = cv2.inRange(hsv, lower_skin, upper_skin)
-            
-            # Get skin pixels
-            skin_pixels = image[skin_mask > 0]
-            
-            if len(skin_pixels) == 0:
-                return 'unknown'
-            
-            # Calculate average brightness of skin pixels
-            avg_brightness = np.mean(cv2.cvtColor(skin_pixels.reshape(-1, 1, 3), cv2.COLOR_BGR2GRAY))
-            
-            # Classify based on brightness thresholds
-            if avg_brightness > 180:
-                return 'light'
-            elif avg_brightness > 120:
-                return 'medium'
-            else:
-                return 'dark'
-                
+                return np.nan
+            return cls._skin_brightness(image)
         except Exception as e:
             print(f"Error classifying skin tone for {image_path}: {e}")
-            return 'unknown'
+            return np.nan
+    
+    @classmethod
+    def classify_skin_tones_batch(cls, image_paths: List[str], num_workers: Optional[int] = None) -> np.ndarray:
+        """
+        Classify many images at once, decoding on a thread pool (OpenCV
+        releases the GIL) unless num_workers == 1.
+        Returns: array of 'light', 'medium', 'dark' or 'unknown', one per path
+        """
+        if num_workers == 1 or len(image_paths) <= 1:
+            brightness = np.array([cls._image_brightness(p) for p in image_paths], dtype=np.float64)
+        else:
+            with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+                brightness = np.fromiter(
+                    executor.map(cls._image_brightness, image_paths),
+                    dtype=np.float64, count=len(image_paths)
+                )
+        
+        # Bucket all brightness values at once instead of branching per image
+        labels = cls.TONE_LABELS[np.digitize(np.nan_to_num(brightness), cls.BRIGHTNESS_BINS, right=True)]
+        return np.where(np.isnan(brightness), 'unknown', labels).astype(object)
+    
+    @classmethod
+    def classify_skin_tone_simple(cls, image_path: str) -> str:
+        """
+        Simple skin tone classification based on average skin color
+        Returns: 'light', 'medium', 'dark'
+        """
+        return cls.classify_skin_tones_batch([image_path])[0]
 
 
 class FairnessEvaluator:
     """Comprehensive fairness evaluation for skin lesion detection"""
     
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, skin_tone_cache: Optional[str] = "skin_tones.csv", batch_size: int = 64):
         """
         Initialize fairness evaluator
         
         Args:
             model_path: Path to trained model
+            skin_tone_cache: CSV of skin-tone labels keyed by path, mtime and
+                size, reused across runs (None disables caching)
+            batch_size: Inference batch size
         """
+        # TensorFlow is only needed once a model is loaded, so importing this
+        # module (e.g. just for SkinToneClassifier) does not pay for it
+        import tensorflow as tf
+        
+        # Grow GPU memory as batches need it instead of reserving it all up front
+        for gpu in tf.config.list_physical_devices('GPU'):
+            try:
+                tf.config.experimental.set_memory_growth(gpu, True)
+            except RuntimeError:
+                pass  # GPU already initialized by an earlier model
+        
         self.model = tf.keras.models.load_model(model_path)
+        self.batch_size = batch_size
         self.skin_classifier = SkinToneClassifier()
+        self.skin_tone_cache = skin_tone_cache
         
     def evaluate_model_fairness(self, 
                               test_data_path: str,
-                              image_metadata: Optional[pd.DataFrame] = None) -> Dict:
+                              image_metadata: Optional[pd.DataFrame] = None,
+                              mmap_test_data: bool = True) -> Dict:
         """
         Comprehensive fairness evaluation
         
         Args:
             test_data_path: Path to test dataset
             image_metadata: Optional metadata with demographic information
+                (one row per test image)
+            mmap_test_data: Stream test images from the memory-mapped decode
+                cache instead of copying the test split into RAM
             
         Returns:
             Dictionary containing fairness metrics
         """
-        # Load test data
-        _, X_test, _, y_test, class_map = load_dataset(test_data_path)
-        
-        # Get predictions
-        y_pred = self.model.predict(X_test)
-        y_pred_classes = np.argmax(y_pred, axis=1)
-        y_true_classes = np.argmax(y_test, axis=1)
+        # Load test data - same split as train.py, uint8 and scaled to [0, 1]
+        # per batch by the pipeline
+        X, y, (_, _, test_idx), class_map, _, paths = load_dataset_splits(
+            test_data_path, test_size=0.15, validation_size=0.15, return_paths=True
+        )
+        y_test = y[test_idx]
         
         # If no metadata provided, classify skin tones from images
         if image_metadata is None:
-            skin_tones = self._classify_skin_tones_from_dataset(test_data_path)
+            skin_tones = self._classify_skin_tones([paths[i] for i in test_idx])
         else:
             skin_tones = image_metadata['skin_tone'].values
         
+        # Row indices of each known skin tone, shared by the helpers below
+        group_index = self._group_indices(skin_tones)
+        
+        # Fairness needs two groups to compare - check before paying for inference
+        if len(group_index) < 2:
+            return {'error': 'Need at least 2 groups for fairness evaluation'}
+        
+        # Get predictions, streaming prefetched batches through the model
+        if mmap_test_data:
+            test_ds = make_streaming_dataset(X, y, test_idx, batch_size=self.batch_size)
+        else:
+            test_ds = make_tf_dataset(X[test_idx], y_test, batch_size=self.batch_size)
+        y_pred = self.model.predict(test_ds, verbose=0)
+        y_pred_classes = np.argmax(y_pred, axis=1)
+        y_true_classes = np.argmax(y_test, axis=1)
+        max_proba = y_pred.max(axis=1)
+        
+        # One pass over the labels; every metric below reduces this histogram
+        confusion = self._group_confusion(
+            y_true_classes, y_pred_classes, group_index, num_classes=y_pred.shape[1]
+        )
+        
         # Overall performance metrics
-        overall_metrics = self._calculate_overall_metrics(y_true_classes, y_pred_classes)
+        overall_metrics = self._calculate_overall_metrics(y_true_classes, y_pred_classes, confusion)
         
         # Group-wise performance
         group_metrics = self._calculate_group_metrics(
-            y_true_classes, y_pred_classes, skin_tones
+            y_true_classes, y_pred_classes, group_index, confusion
         )
         
         # Fairness metrics
         fairness_metrics = self._calculate_fairness_metrics(
-            y_true_classes, y_pred_classes, skin_tones
+            y_true_classes, y_pred_classes, group_index, confusion
         )
         
         # Bias analysis
         bias_analysis = self._analyze_bias_patterns(
-            y_true_classes, y_pred_classes, skin_tones, y_pred
+            y_true_classes, y_pred_classes, group_index, max_proba
         )
         
         return {
@@ -126,227 +200,354 @@ class FairnessEvaluator:
     
     def _classify_skin_tones_from_dataset(self, dataset_path: str) -> List[str]:
         """Classify skin tones for all images in dataset"""
-        skin_tones = []
-        
-        for class_name in os.listdir(dataset_path):
-            class_dir = os.path.join(dataset_path, class_name)
-            if not os.path.isdir(class_dir):
-                continue
-                
-            for img_file in os.listdir(class_dir):
-                img_path = os.path.join(class_dir, img_file)
-                skin_tone = self.skin_classifier.classify_skin_tone_simple(img_path)
-                skin_tones.append(skin_tone)
-        
-        return skin_tones
+        # DirEntry knows whether it is a directory without another stat call
+        entries = []
+        with os.scandir(dataset_path) as class_dirs:
+            for class_dir in class_dirs:
+                if not class_dir.is_dir():
+                    continue
+                with os.scandir(class_dir.path) as files:
+                    entries.extend(f for f in files if f.is_file())
+        
+        return self._classify_skin_tones([entry.path for entry in entries], entries)
+    
+    def _classify_skin_tones(self, image_paths: List[str], entries=None) -> List[str]:
+        """
+        Classify skin tones for image_paths, in order, reusing cached labels.
+        entries: optional os.DirEntry per path, to reuse their stat info
+        """
+        if not self.skin_tone_cache:
+            return list(self.skin_classifier.classify_skin_tones_batch(image_paths))
+        
+        # Only classify images that are new or changed since the cached run
+        if entries is not None:
+            stats = [entry.stat() for entry in entries]
+        else:
+            stats = [os.stat(path) for path in image_paths]
+        files = pd.DataFrame({
+            'path': image_paths,
+            'mtime_ns': [st.st_mtime_ns for st in stats],
+            'size': [st.st_size for st in stats]
+        })
+        cache = self._read_skin_tone_cache()
+        files = files.merge(cache, on=['path', 'mtime_ns', 'size'], how='left')
+        
+        missing = files['skin_tone'].isna().to_numpy()
+        if missing.any():
+            files.loc[missing, 'skin_tone'] = self.skin_classifier.classify_skin_tones_batch(
+                files.loc[missing, 'path'].tolist()
+            )
+            # Keep cached rows for images outside this call; current rows win
+            merged = pd.concat([files, cache], ignore_index=True).drop_duplicates('path', keep='first')
+            merged.to_csv(self.skin_tone_cache, index=False)
+        
+        return files['skin_tone'].tolist()
+    
+    def _read_skin_tone_cache(self) -> pd.DataFrame:
+        """Cached (path, mtime_ns, size, skin_tone) rows, empty if there is no usable cache"""
+        columns = ['path', 'mtime_ns', 'size', 'skin_tone']
+        try:
+            cache = pd.read_csv(self.skin_tone_cache, dtype={'path': str, 'skin_tone': str})
+            return cache[columns].astype({'mtime_ns': 'int64', 'size': 'int64'})
+        except (OSError, ValueError, KeyError, pd.errors.EmptyDataError):
+            return pd.DataFrame({
+                'path': pd.Series(dtype=str),
+                'mtime_ns': pd.Series(dtype='int64'),
+                'size': pd.Series(dtype='int64'),
+                'skin_tone': pd.Series(dtype=str)
+            })
+    
+    @staticmethod
+    def _group_indices(groups: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Row indices of every group except 'unknown', built with one sort
+        instead of a full-array comparison per group per helper.
+        """
+        # Hash-based encoding: only the few unique names get sorted, not the
+        # N strings, and the argsort below is over small integer codes
+        inverse, unique_groups = pd.factorize(pd.Series(groups, dtype=object), sort=True, use_na_sentinel=False)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.cumsum(np.bincount(inverse, minlength=len(unique_groups)))[:-1]
+        
+        group_index = dict(zip(unique_groups.tolist(), np.split(order, bounds)))
+        group_index.pop('unknown', None)
+        return group_index
     
-    def _calculate_overall_metrics(self, y_true: np.ndarray, y_pred: np.ndarray) -> Dict:
-        """Calculate overall performance metrics"""
+    @staticmethod
+    def _group_confusion(y_true: np.ndarray, 
+                         y_pred: np.ndarray, 
+                         group_index: Dict[str, np.ndarray],
+                         num_classes: Optional[int] = None) -> np.ndarray:
+        """
+        Joint histogram H[group, true, pred] from a single bincount over all rows.
+        Rows outside group_index ('unknown') go in one extra last slot, so
+        H.sum(axis=0) is the overall confusion matrix.
+        """
+        if num_classes is None:
+            num_classes = max(2, int(max(y_true.max(initial=0), y_pred.max(initial=0))) + 1)
+        
+        num_groups = len(group_index)
+        group_id = np.full(len(y_true), num_groups, dtype=np.int64)
+        for g, idx in enumerate(group_index.values()):
+            group_id[idx] = g
+        
+        key = (group_id * num_classes + y_true) * num_classes + y_pred
+        counts = np.bincount(key, minlength=(num_groups + 1) * num_classes * num_classes)
+        return counts.reshape(num_groups + 1, num_classes, num_classes)
+    
+    @staticmethod
+    def _weighted_scores(confusion: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """
+        Accuracy and support-weighted precision, recall and F1 of a stack of
+        (C, C) confusion matrices, with 0 for undefined per-class scores
+        (sklearn's average='weighted', zero_division=0)
+        """
+        correct = confusion.diagonal(axis1=-2, axis2=-1)
+        support = confusion.sum(axis=-1)
+        predicted = confusion.sum(axis=-2)
+        total = support.sum(axis=-1, keepdims=True)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, correct / predicted, 0.0)
+            recall = np.where(support > 0, correct / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+            weights = support / total
+        
+        accuracy = correct.sum(axis=-1) / total[..., 0]
+        return accuracy, (precision * weights).sum(axis=-1), (recall * weights).sum(axis=-1), (f1 * weights).sum(axis=-1)
+    
+    def _calculate_overall_metrics(self, 
+                                 y_true: np.ndarray, 
+                                 y_pred: np.ndarray,
+                                 confusion: Optional[np.ndarray] = None) -> Dict:
+        """Calculate overall performance metrics (confusion: H from _group_confusion, if already built)"""
+        if confusion is None:
+            confusion = self._group_confusion(y_true, y_pred, {})
+        cm = confusion.sum(axis=0)
+        accuracy, precision, recall, f1 = self._weighted_scores(cm)
+        
+        # Report only the classes that occur, as sklearn's confusion_matrix does
+        present = (cm.sum(axis=0) + cm.sum(axis=1)) > 0
         return {
-            'accuracy': accuracy_score(y_true, y_pred),
-            'precision': precision_score(y_true, y_pred, average='weighted'),
-            'recall': recall_score(y_true, y_pred, average='weighted'),
-            'f1_score': f1_score(y_true, y_pred, average='weighted'),
-            'confusion_matrix': confusion_matrix(y_true, y_pred).tolist()
+            'accuracy': accuracy,
+            'precision': precision,
+            'recall': recall,
+            'f1_score': f1,
+            'confusion_matrix': cm[np.ix_(present, present)].tolist()
         }
     
     def _calculate_group_metrics(self, 
                                y_true: np.ndarray, 
                                y_pred: np.ndarray, 
-                               groups: List[str]) -> Dict:
+                               group_index: Dict[str, np.ndarray],
+                               confusion: Optional[np.ndarray] = None) -> Dict:
         """Calculate performance metrics for each group"""
-        group_metrics = {}
-        unique_groups = list(set(groups))
-        
-        for group in unique_groups:
-            if group == 'unknown':
-                continue
-                
-            group_mask = np.array(groups) == group
-            
-            if np.sum(group_mask) == 0:
-                continue
-                
-            group_y_true = y_true[group_mask]
-            group_y_pred = y_pred[group_mask]
-            
-            group_metrics[group] = {
-                'sample_size': int(np.sum(group_mask)),
-                'accuracy': accuracy_score(group_y_true, group_y_pred),
-                'precision': precision_score(group_y_true, group_y_pred, average='weighted', zero_division=0),
-                'recall': recall_score(group_y_true, group_y_pred, average='weighted', zero_division=0),
-                'f1_score': f1_score(group_y_true, group_y_pred, average='weighted', zero_division=0)
-            }
+        if confusion is None:
+            confusion = self._group_confusion(y_true, y_pred, group_index)
+        
+        # All groups at once from their (C, C) slices; the last slot is 'unknown'
+        group_cm = confusion[:len(group_index)]
+        accuracy, precision, recall, f1 = self._weighted_scores(group_cm)
+        sizes = group_cm.sum(axis=(1, 2))
         
-        return group_metrics
+        return {
+            group: {
+                'sample_size': int(sizes[g]),
+                'accuracy': accuracy[g],
+                'precision': precision[g],
+                'recall': recall[g],
+                'f1_score': f1[g]
+            }
+            for g, group in enumerate(group_index)
+        }
     
     def _calculate_fairness_metrics(self, 
                                   y_true: np.ndarray, 
                                   y_pred: np.ndarray, 
-                                  groups: List[str]) -> Dict:
+                                  group_index: Dict[str, np.ndarray],
+                                  confusion: Optional[np.ndarray] = None) -> Dict:
         """Calculate fairness-specific metrics"""
         fairness_metrics = {}
-        unique_groups = [g for g in set(groups) if g != 'unknown']
         
-        if len(unique_groups) < 2:
+        if len(group_index) < 2:
             return {'error': 'Need at least 2 groups for fairness evaluation'}
         
+        if confusion is None:
+            confusion = self._group_confusion(y_true, y_pred, group_index)
+        
+        # [TN, FP, FN, TP] per group are the corners of its binary confusion matrix
+        group_cm = confusion[:len(group_index)]
+        tn, fp = group_cm[:, 0, 0], group_cm[:, 0, 1]
+        fn, tp = group_cm[:, 1, 0], group_cm[:, 1, 1]
+        positives = tp + fn
+        negatives = fp + tn
+        
         # Calculate demographic parity difference
-        group_positive_rates = {}
-        for group in unique_groups:
-            group_mask = np.array(groups) == group
-            if np.sum(group_mask) > 0:
-                group_positive_rates[group] = np.mean(y_pred[group_mask])
-        
-        if len(group_positive_rates) >= 2:
-            rates = list(group_positive_rates.values())
-            fairness_metrics['demographic_parity_difference'] = max(rates) - min(rates)
-        
-        # Calculate equal opportunity difference
-        group_tpr = {}  # True Positive Rate
-        for group in unique_groups:
-            group_mask = np.array(groups) == group
-            group_y_true = y_true[group_mask]
-            group_y_pred = y_pred[group_mask]
-            
-            if np.sum(group_mask) > 0 and np.sum(group_y_true) > 0:
-                # TPR = TP / (TP + FN)
-                tp = np.sum((group_y_true == 1) & (group_y_pred == 1))
-                fn = np.sum((group_y_true == 1) & (group_y_pred == 0))
-                tpr = tp / (tp + fn) if (tp + fn) > 0 else 0
-                group_tpr[group] = tpr
-        
-        if len(group_tpr) >= 2:
-            tpr_values = list(group_tpr.values())
-            fairness_metrics['equal_opportunity_difference'] = max(tpr_values) - min(tpr_values)
-        
-        # Calculate equalized odds difference  
-        group_fpr = {}  # False Positive Rate
-        for group in unique_groups:
-            group_mask = np.array(groups) == group
-            group_y_true = y_true[group_mask]
-            group_y_pred = y_pred[group_mask]
-            
-            if np.sum(group_mask) > 0 and np.sum(group_y_true == 0) > 0:
-                # FPR = FP / (FP + TN)
-                fp = np.sum((group_y_true == 0) & (group_y_pred == 1))
-                tn = np.sum((group_y_true == 0) & (group_y_pred == 0))
-                fpr = fp / (fp + tn) if (fp + tn) > 0 else 0
-                group_fpr[group] = fpr
-        
-        if len(group_tpr) >= 2 and len(group_fpr) >= 2:
-            tpr_diff = max(group_tpr.values()) - min(group_tpr.values())
-            fpr_diff = max(group_fpr.values()) - min(group_fpr.values())
-            fairness_metrics['equalized_odds_difference'] = max(tpr_diff, fpr_diff)
+        positive_rates = (tp + fp) / group_cm.sum(axis=(1, 2))
+        fairness_metrics['demographic_parity_difference'] = np.ptp(positive_rates)
+        
+        # Calculate equal opportunity difference (TPR = TP / (TP + FN)),
+        # over the groups that have positives
+        tpr = tp[positives > 0] / positives[positives > 0]
+        if len(tpr) >= 2:
+            fairness_metrics['equal_opportunity_difference'] = np.ptp(tpr)
+        
+        # Calculate equalized odds difference (FPR = FP / (FP + TN)),
+        # over the groups that have negatives
+        fpr = fp[negatives > 0] / negatives[negatives > 0]
+        if len(tpr) >= 2 and len(fpr) >= 2:
+            fairness_metrics['equalized_odds_difference'] = max(np.ptp(tpr), np.ptp(fpr))
         
         return fairness_metrics
     
     def _analyze_bias_patterns(self, 
                               y_true: np.ndarray, 
                               y_pred: np.ndarray, 
-                              groups: List[str],
-                              y_pred_proba: np.ndarray) -> Dict:
-        """Analyze bias patterns in predictions"""
-        bias_analysis = {}
-        unique_groups = [g for g in set(groups) if g != 'unknown']
-        
-        # Confidence distribution by group
-        confidence_by_group = {}
-        for group in unique_groups:
-            group_mask = np.array(groups) == group
-            if np.sum(group_mask) > 0:
-                group_confidences = np.max(y_pred_proba[group_mask], axis=1)
-                confidence_by_group[group] = {
-                    'mean_confidence': float(np.mean(group_confidences)),
-                    'std_confidence': float(np.std(group_confidences)),
-                    'min_confidence': float(np.min(group_confidences)),
-                    'max_confidence': float(np.max(group_confidences))
-                }
-        
-        bias_analysis['confidence_by_group'] = confidence_by_group
+                              group_index: Dict[str, np.ndarray],
+                              max_proba: np.ndarray) -> Dict:
+        """Analyze bias patterns in predictions (max_proba: confidence of each prediction)"""
+        bias_analysis = {'confidence_by_group': {}, 'error_rates_by_group': {}}
+        if not group_index:
+            return bias_analysis
+        
+        # Lay the rows out group by group so every statistic is a single
+        # reduceat pass over contiguous segments
+        groups = list(group_index)
+        order = np.concatenate(list(group_index.values()))
+        sizes = np.array([len(idx) for idx in group_index.values()])
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        
+        # Confidence distribution by group (std from E[x^2] - E[x]^2); the
+        # gather runs over the model's float32 output and only then widens for the sums
+        confidences = max_proba[order].astype(np.float64)
+        means = np.add.reduceat(confidences, starts) / sizes
+        variances = np.add.reduceat(confidences * confidences, starts) / sizes - means * means
+        stds = np.sqrt(np.maximum(variances, 0))
+        mins = np.minimum.reduceat(confidences, starts)
+        maxs = np.maximum.reduceat(confidences, starts)
+        
+        bias_analysis['confidence_by_group'] = {
+            group: {
+                'mean_confidence': float(means[i]),
+                'std_confidence': float(stds[i]),
+                'min_confidence': float(mins[i]),
+                'max_confidence': float(maxs[i])
+            }
+            for i, group in enumerate(groups)
+        }
         
         # Error rate by group
-        error_rates = {}
-        for group in unique_groups:
-            group_mask = np.array(groups) == group
-            if np.sum(group_mask) > 0:
-                group_y_true = y_true[group_mask]
-                group_y_pred = y_pred[group_mask]
-                error_rate = np.mean(group_y_true != group_y_pred)
-                error_rates[group] = float(error_rate)
-        
-        bias_analysis['error_rates_by_group'] = error_rates
+        error_rates = np.add.reduceat((y_true != y_pred)[order], starts) / sizes
+        bias_analysis['error_rates_by_group'] = {
+            group: float(error_rates[i]) for i, group in enumerate(groups)
+        }
         
         return bias_analysis
     
-    def generate_fairness_report(self, evaluation_results: Dict, output_path: str = None):
-        """Generate comprehensive fairness report"""
-        report = []
-        report.append("=" * 80)
-        report.append("FAIRNESS EVALUATION REPORT")
-        report.append("=" * 80)
-        report.append("")
-        
-        # Overall metrics
-        report.append("OVERALL MODEL PERFORMANCE:")
-        report.append("-" * 40)
+    @staticmethod
+    def results_table(evaluation_results: Dict) -> pd.DataFrame:
+        """
+        Flatten evaluation results into a long-form (group, metric, value) table.
+        Tables from several audits or models combine with a plain concat.
+        """
+        rows = []
         overall = evaluation_results['overall_metrics']
-        report.append(f"Accuracy: {overall['accuracy']:.4f}")
-        report.append(f"Precision: {overall['precision']:.4f}")
-        report.append(f"Recall: {overall['recall']:.4f}")
-        report.append(f"F1 Score: {overall['f1_score']:.4f}")
-        report.append("")
+        for metric, value in overall.items():
+            if metric == 'confusion_matrix':
+                for i, row in enumerate(value):
+                    rows.extend(('overall', f'confusion_{i}_{j}', count) for j, count in enumerate(row))
+            else:
+                rows.append(('overall', metric, value))
         
-        # Group metrics
-        report.append("GROUP-WISE PERFORMANCE:")
-        report.append("-" * 40)
         for group, metrics in evaluation_results['group_metrics'].items():
-            report.append(f"\n{group.upper()} SKIN TONE:")
-            report.append(f"  Sample Size: {metrics['sample_size']}")
-            report.append(f"  Accuracy: {metrics['accuracy']:.4f}")
-            report.append(f"  Precision: {metrics['precision']:.4f}")
-            report.append(f"  Recall: {metrics['recall']:.4f}")
-            report.append(f"  F1 Score: {metrics['f1_score']:.4f}")
-        report.append("")
+            rows.extend((group, metric, value) for metric, value in metrics.items())
         
-        # Fairness metrics
-        report.append("FAIRNESS METRICS:")
-        report.append("-" * 40)
-        fairness = evaluation_results['fairness_metrics']
+        rows.extend(('all', metric, value) for metric, value in evaluation_results['fairness_metrics'].items())
+        
+        bias = evaluation_results['bias_analysis']
+        for group, stats in bias['confidence_by_group'].items():
+            rows.extend((group, metric, value) for metric, value in stats.items())
+        rows.extend((group, 'error_rate', value) for group, value in bias['error_rates_by_group'].items())
         
-        if 'demographic_parity_difference' in fairness:
-            dpd = fairness['demographic_parity_difference']
-            report.append(f"Demographic Parity Difference: {dpd:.4f}")
-            report.append(f"  Interpretation: {'FAIR' if dpd < 0.1 else 'UNFAIR'} (threshold: 0.1)")
+        table = pd.DataFrame(rows, columns=['group', 'metric', 'value'])
+        table['value'] = table['value'].astype('float64')
+        return table.astype({'group': 'category', 'metric': 'category'})
+    
+    def save_results_table(self, evaluation_results: Dict, output_path: str) -> str:
+        """Write the results table as zstd Parquet, or as CSV if pyarrow is not installed"""
+        table = self.results_table(evaluation_results)
+        if pq is None:
+            output_path = os.path.splitext(output_path)[0] + '.csv'
+            table.to_csv(output_path, index=False)
+        else:
+            pq.write_table(
+                pa.Table.from_pandas(table, preserve_index=False),
+                output_path, compression='zstd', use_dictionary=True
+            )
+        return output_path
+    
+    def generate_fairness_report(self, evaluation_results: Dict, output_path: str = None):
+        """Generate comprehensive fairness report"""
+        overall = evaluation_results['overall_metrics']
+        fairness = evaluation_results['fairness_metrics']
+        bias = evaluation_results['bias_analysis']
         
-        if 'equal_opportunity_difference' in fairness:
-            eod = fairness['equal_opportunity_difference']
-            report.append(f"Equal Opportunity Difference: {eod:.4f}")
-            report.append(f"  Interpretation: {'FAIR' if eod < 0.1 else 'UNFAIR'} (threshold: 0.1)")
+        # One template per section instead of an append per line
+        report = [f"""{"=" * 80}
+FAIRNESS EVALUATION REPORT
+{"=" * 80}
+
+OVERALL MODEL PERFORMANCE:
+{"-" * 40}
+Accuracy: {overall['accuracy']:.4f}
+Precision: {overall['precision']:.4f}
+Recall: {overall['recall']:.4f}
+F1 Score: {overall['f1_score']:.4f}
+
+GROUP-WISE PERFORMANCE:
+{"-" * 40}"""]
         
-        if 'equalized_odds_difference' in fairness:
-            eqod = fairness['equalized_odds_difference']
-            report.append(f"Equalized Odds Difference: {eqod:.4f}")
-            report.append(f"  Interpretation: {'FAIR' if eqod < 0.1 else 'UNFAIR'} (threshold: 0.1)")
+        # Group metrics
+        report.extend(
+            f"""
+{group.upper()} SKIN TONE:
+  Sample Size: {metrics['sample_size']}
+  Accuracy: {metrics['accuracy']:.4f}
+  Precision: {metrics['precision']:.4f}
+  Recall: {metrics['recall']:.4f}
+  F1 Score: {metrics['f1_score']:.4f}"""
+            for group, metrics in evaluation_results['group_metrics'].items()
+        )
         
-        report.append("")
+        # Fairness metrics
+        report.append(f"""
+FAIRNESS METRICS:
+{"-" * 40}""")
+        for key, label in [('demographic_parity_difference', 'Demographic Parity Difference'),
+                           ('equal_opportunity_difference', 'Equal Opportunity Difference'),
+                           ('equalized_odds_difference', 'Equalized Odds Difference')]:
+            if key in fairness:
+                value = fairness[key]
+                report.append(f"""{label}: {value:.4f}
+  Interpretation: {'FAIR' if value < 0.1 else 'UNFAIR'} (threshold: 0.1)""")
         
         # Bias analysis
-        report.append("BIAS ANALYSIS:")
-        report.append("-" * 40)
-        bias = evaluation_results['bias_analysis']
+        report.append(f"""
+BIAS ANALYSIS:
+{"-" * 40}""")
         
         if 'error_rates_by_group' in bias:
             report.append("Error Rates by Group:")
-            for group, error_rate in bias['error_rates_by_group'].items():
-                report.append(f"  {group}: {error_rate:.4f}")
+            report.extend(f"  {group}: {error_rate:.4f}" for group, error_rate in bias['error_rates_by_group'].items())
         
         if 'confidence_by_group' in bias:
             report.append("\nConfidence Statistics by Group:")
-            for group, stats in bias['confidence_by_group'].items():
-                report.append(f"  {group}:")
-                report.append(f"    Mean Confidence: {stats['mean_confidence']:.4f}")
-                report.append(f"    Std Confidence: {stats['std_confidence']:.4f}")
+            report.extend(
+                f"""  {group}:
+    Mean Confidence: {stats['mean_confidence']:.4f}
+    Std Confidence: {stats['std_confidence']:.4f}"""
+                for group, stats in bias['confidence_by_group'].items()
+            )
         
         report_text = "\n".join(report)
         
@@ -366,6 +567,9 @@ if __name__ == "__main__":
         
         dataset_path = "dataset/processed"
         results = evaluator.evaluate_model_fairness(dataset_path)
+        if 'error' in results:
+            print(f"Fairness evaluation skipped: {results['error']}")
+            raise SystemExit(1)
         
         # Generate report
         report = evaluator.generate_fairness_report(results)
@@ -374,5 +578,9 @@ if __name__ == "__main__":
         # Save report
         evaluator.generate_fairness_report(results, "fairness_report.txt")
         print("\nFairness report saved to fairness_report.txt")
+        
+        # Machine-readable results for comparing audits
+        table_path = evaluator.save_results_table(results, "fairness_results.parquet")
+        print(f"Fairness results table saved to {table_path}")
     else:
         print(f"Model not found at {model_path}. Please train a model first.")
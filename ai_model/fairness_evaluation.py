@@ -5,18 +5,22 @@ Analyzes bias across different demographic groups and skin tones
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from aif360.datasets import BinaryLabelDataset
-from aif360.metrics import BinaryLabelDatasetMetric, ClassificationMetric
 import cv2
 from typing import Dict, List, Tuple, Optional
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import seaborn as sns
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    from .json_io import write_json
+except ImportError:
+    from json_io import write_json
+
 class SkinToneDetector:
     """Detect skin tone from medical images using computer vision"""
     
@@ -28,6 +32,35 @@ class SkinToneDetector:
             'dark': [(5, 30, 30), (20, 255, 150)],          # Dark skin (Type V)
             'very_dark': [(0, 10, 10), (15, 200, 100)]      # Very dark skin (Type VI)
         }
+        
+        # The ranges are boxes in HSV, so a pixel's tones are the AND of
+        # per-channel memberships. Bit i of _channel_lut[x, 0, c] says
+        # whether value x of channel c is inside the range of tone i.
+        self._channel_lut = np.zeros((256, 1, 3), dtype=np.uint8)
+        for i, (lower, upper) in enumerate(self.skin_tone_ranges.values()):
+            for c in range(3):
+                self._channel_lut[lower[c]:upper[c] + 1, 0, c] |= 1 << i
+        
+        # Row b: which tones a pixel with membership bits b counts towards
+        codes = np.arange(1 << len(self.skin_tone_ranges))
+        self._code_tones = (codes[:, None] >> np.arange(len(self.skin_tone_ranges))) & 1
+    
+    def _classify_hsv(self, hsv: np.ndarray) -> str:
+        """Predominant skin tone of an HSV image, or 'unknown'"""
+        # Membership bits of every pixel in one pass (the ranges overlap,
+        # so a pixel can count towards several tones), then a histogram
+        # of the bit patterns instead of one mask per tone
+        bits = cv2.LUT(hsv, self._channel_lut)
+        codes = bits[..., 0] & bits[..., 1] & bits[..., 2]
+        num_codes = len(self._code_tones)
+        code_counts = cv2.calcHist([codes], [0], None, [num_codes], [0, num_codes]).ravel()
+        tone_pixels = code_counts.astype(np.int64) @ self._code_tones
+        
+        # Return the tone with most pixels (first one on ties)
+        if tone_pixels.sum() == 0:
+            return 'unknown'
+        
+        return list(self.skin_tone_ranges)[int(np.argmax(tone_pixels))]
     
     def detect_skin_tone(self, image_path: str) -> str:
         """
@@ -35,40 +68,42 @@ class SkinToneDetector:
         Returns: skin tone category as string
         """
         try:
-            # Read image
-            image = cv2.imread(image_path)
+            # Read image at half resolution (JPEG decodes at reduced scale,
+            # a quarter of the pixels); tone is a pixel proportion, so
+            # the count ratios survive the downscale
+            image = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_2)
             if image is None:
                 return 'unknown'
             
             # Convert to HSV for better skin detection
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            
-            # Create masks for different skin tones
-            tone_pixels = {}
-            
-            for tone, (lower, upper) in self.skin_tone_ranges.items():
-                lower = np.array(lower)
-                upper = np.array(upper)
-                mask = cv2.inRange(hsv, lower, upper)
-                tone_pixels[tone] = np.sum(mask > 0)
-            
-            # Return the tone with most pixels
-            if sum(tone_pixels.values()) == 0:
-                return 'unknown'
-            
-            return max(tone_pixels, key=tone_pixels.get)
+            return self._classify_hsv(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
             
         except Exception as e:
             print(f"Error detecting skin tone: {e}")
             return 'unknown'
     
+    def detect_skin_tones_batch(self, image_paths: List[str], num_workers: Optional[int] = None) -> List[str]:
+        """
+        Detect skin tones of many images, decoding on a thread pool (OpenCV
+        releases the GIL) unless num_workers == 1.
+        Returns: skin tone category per path, in order
+        """
+        if num_workers == 1 or len(image_paths) <= 1:
+            return [self.detect_skin_tone(path) for path in image_paths]
+        
+        with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+            return list(executor.map(self.detect_skin_tone, image_paths))
+    
     def analyze_brightness(self, image_path: str) -> float:
         """
         Analyze overall brightness of the image
         Returns: brightness score (0-1)
         """
         try:
-            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            # The mean survives box downsampling, so let the decoder work
+            # at 1/8 scale (libjpeg scales in the DCT) instead of decoding
+            # every pixel of a large scan
+            image = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
             if image is None:
                 return 0.5
             
@@ -76,6 +111,24 @@ class SkinToneDetector:
             
         except Exception:
             return 0.5
+    
+    def analyze_image(self, image_path: str) -> Tuple[str, float]:
+        """
+        Skin tone and brightness of the image from a single read
+        Returns: (skin tone category, brightness score 0-1)
+        """
+        try:
+            image = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_2)
+            if image is None:
+                return 'unknown', 0.5
+            
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            tone = self._classify_hsv(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
+            return tone, cv2.mean(gray)[0] / 255.0
+            
+        except Exception as e:
+            print(f"Error analyzing image: {e}")
+            return 'unknown', 0.5
 
 class FairnessEvaluator:
     """Comprehensive fairness evaluation for skin lesion detection"""
@@ -97,170 +150,191 @@ class FairnessEvaluator:
             'statistical_parity',
             'disparate_impact'
         ]
+        
+        # Figure reused by every create_visualizations call
+        self._fig = None
+        self._axes = None
     
     def create_synthetic_demographics(self, n_samples: int = 1000) -> pd.DataFrame:
         """
         Create synthetic demographic data for testing
         """
-        np.random.seed(42)
+        # One seeded Generator (PCG64) for every draw, without touching
+        # the global NumPy random state
+        rng = np.random.default_rng(42)
+        
+        def categorical(categories, p):
+            # Draw category codes rather than strings; groupby and masks
+            # then work on codes
+            codes = rng.choice(len(categories), n_samples, p=p)
+            return pd.Categorical.from_codes(codes, categories=categories)
         
         # Generate synthetic data
         data = {
             'patient_id': range(n_samples),
-            'skin_tone': np.random.choice(
+            'skin_tone': categorical(
                 ['very_light', 'light', 'medium', 'dark', 'very_dark'], 
-                n_samples, 
                 p=[0.3, 0.25, 0.2, 0.15, 0.1]  # Realistic distribution
             ),
-            'age_group': np.random.choice(
-                ['young', 'middle_aged', 'elderly'], 
-                n_samples, 
-                p=[0.3, 0.4, 0.3]
-            ),
-            'gender': np.random.choice(['male', 'female'], n_samples, p=[0.48, 0.52]),
-            'image_quality': np.random.choice(
-                ['high', 'medium', 'low'], 
-                n_samples, 
-                p=[0.4, 0.5, 0.1]
-            ),
-            'true_label': np.random.choice([0, 1], n_samples, p=[0.7, 0.3]),  # 30% malignant
+            'age_group': categorical(['young', 'middle_aged', 'elderly'], p=[0.3, 0.4, 0.3]),
+            'gender': categorical(['male', 'female'], p=[0.48, 0.52]),
+            'image_quality': categorical(['high', 'medium', 'low'], p=[0.4, 0.5, 0.1]),
+            'true_label': rng.choice([0, 1], n_samples, p=[0.7, 0.3]),  # 30% malignant
         }
         
         # Add bias: darker skin tones have higher false positive rates
-        predicted_labels = []
-        for i in range(n_samples):
-            true_label = data['true_label'][i]
-            skin_tone = data['skin_tone'][i]
-            
-            # Base accuracy varies by skin tone (simulating bias)
-            if skin_tone in ['very_light', 'light']:
-                accuracy = 0.92
-            elif skin_tone == 'medium':
-                accuracy = 0.88
-            elif skin_tone == 'dark':
-                accuracy = 0.82
-            else:  # very_dark
-                accuracy = 0.76
-            
-            # Simulate prediction with bias
-            if np.random.random() < accuracy:
-                predicted_labels.append(true_label)
-            else:
-                # Add bias: more false positives for darker skin
-                if skin_tone in ['dark', 'very_dark'] and true_label == 0:
-                    predicted_labels.append(1)  # False positive
-                else:
-                    predicted_labels.append(1 - true_label)
+        # Base accuracy varies by skin tone (simulating bias)
+        tone_accuracy = np.array([0.92, 0.92, 0.88, 0.82, 0.76])
+        accuracy = tone_accuracy[data['skin_tone'].codes]
         
-        data['predicted_label'] = predicted_labels
-        data['confidence'] = np.random.uniform(0.6, 0.99, n_samples)
+        # Simulate prediction with bias - one draw per sample. A wrong
+        # prediction flips the label, which for a benign case on darker
+        # skin is the intended false positive.
+        true_labels = data['true_label']
+        correct = rng.random(n_samples) < accuracy
+        
+        data['predicted_label'] = np.where(correct, true_labels, 1 - true_labels)
+        data['confidence'] = rng.uniform(0.6, 0.99, n_samples)
         
         return pd.DataFrame(data)
     
-    def compute_group_metrics(self, df: pd.DataFrame, group_col: str) -> Dict:
+    @staticmethod
+    def _outcome_flags(df: pd.DataFrame) -> pd.DataFrame:
+        """TP/FP/TN/FN flag per row, computed once and shared by every attribute"""
+        y_true = df['true_label'].to_numpy()
+        y_pred = df['predicted_label'].to_numpy()
+        return pd.DataFrame({
+            'tp': (y_true == 1) & (y_pred == 1),
+            'fp': (y_true == 0) & (y_pred == 1),
+            'tn': (y_true == 0) & (y_pred == 0),
+            'fn': (y_true == 1) & (y_pred == 0)
+        })
+    
+    def _group_confusion(self, df: pd.DataFrame, group_col: str, outcomes: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """TP/FP/TN/FN counts per group (first-seen order) from one groupby pass"""
+        if outcomes is None:
+            outcomes = self._outcome_flags(df)
+        return outcomes.groupby(df[group_col].array, sort=False, observed=True).sum()
+    
+    def compute_group_metrics(self, df: pd.DataFrame, group_col: str, counts: Optional[pd.DataFrame] = None) -> Dict:
         """
         Compute performance metrics for each group
+        counts: per-group confusion counts from _group_confusion, if already built
         """
         results = {}
         
-        for group in df[group_col].unique():
-            group_data = df[df[group_col] == group]
-            
-            if len(group_data) == 0:
-                continue
-            
-            y_true = group_data['true_label']
-            y_pred = group_data['predicted_label']
-            
-            results[group] = {
-                'sample_size': len(group_data),
-                'accuracy': accuracy_score(y_true, y_pred),
-                'precision': precision_score(y_true, y_pred, zero_division=0),
-                'recall': recall_score(y_true, y_pred, zero_division=0),
-                'f1_score': f1_score(y_true, y_pred, zero_division=0),
-                'positive_rate': np.mean(y_pred),
-                'true_positive_rate': recall_score(y_true, y_pred, zero_division=0),
-                'false_positive_rate': np.mean(y_pred[y_true == 0]) if np.sum(y_true == 0) > 0 else 0
-            }
+        # Every metric is closed-form in the group's confusion counts, instead
+        # of a boolean filter over the whole frame plus sklearn calls per group
+        if counts is None:
+            counts = self._group_confusion(df, group_col)
+        
+        for group, group_counts in zip(counts.index, counts[['tp', 'fp', 'tn', 'fn']].to_numpy()):
+            results[group] = self._binary_metrics(*group_counts)
         
         return results
     
-    def compute_fairness_metrics(self, df: pd.DataFrame, protected_attr: str) -> Dict:
+    @staticmethod
+    def _binary_metrics(tp: int, fp: int, tn: int, fn: int) -> Dict:
         """
-        Compute fairness metrics using AIF360
+        Binary classification metrics from confusion counts, 0 where undefined
+        (sklearn's zero_division=0) - no per-call input validation
+        """
+        size = tp + fp + tn + fn
+        precision = tp / (tp + fp) if tp + fp > 0 else 0.0
+        recall = tp / (tp + fn) if tp + fn > 0 else 0.0
+        
+        return {
+            'sample_size': int(size),
+            'accuracy': (tp + tn) / size,
+            'precision': precision,
+            'recall': recall,
+            'f1_score': 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0,
+            'positive_rate': (tp + fp) / size,
+            'true_positive_rate': recall,
+            'false_positive_rate': fp / (fp + tn) if fp + tn > 0 else 0
+        }
+    
+    def compute_fairness_metrics(self, df: pd.DataFrame, protected_attr: str, counts: Optional[pd.DataFrame] = None) -> Dict:
+        """
+        Compute fairness metrics (AIF360 definitions, unprivileged minus privileged)
+        counts: per-group confusion counts from _group_confusion, if already built
         """
         try:
-            # Prepare data for AIF360
-            favorable_label = 1
-            unfavorable_label = 0
-            
             # Create privileged and unprivileged groups
             # For skin tone: light tones are privileged
             if protected_attr == 'skin_tone':
-                privileged_groups = [{'skin_tone': 'very_light'}, {'skin_tone': 'light'}]
-                unprivileged_groups = [{'skin_tone': 'dark'}, {'skin_tone': 'very_dark'}]
+                privileged_values = ['very_light', 'light']
+                unprivileged_values = ['dark', 'very_dark']
             elif protected_attr == 'age_group':
-                privileged_groups = [{'age_group': 'middle_aged'}]
-                unprivileged_groups = [{'age_group': 'elderly'}]
+                privileged_values = ['middle_aged']
+                unprivileged_values = ['elderly']
             elif protected_attr == 'gender':
-                privileged_groups = [{'gender': 'male'}]
-                unprivileged_groups = [{'gender': 'female'}]
+                privileged_values = ['male']
+                unprivileged_values = ['female']
             else:
                 return {}
             
-            # Create AIF360 datasets
-            dataset = BinaryLabelDataset(
-                df=df,
-                label_names=['true_label'],
-                protected_attribute_names=[protected_attr],
-                favorable_label=favorable_label,
-                unfavorable_label=unfavorable_label
+            # Pool the per-group counts - no further scans over the rows
+            if counts is None:
+                counts = self._group_confusion(df, protected_attr)
+            columns = ['tp', 'fp', 'tn', 'fn']
+            return self._fairness_from_counts(
+                counts[counts.index.isin(unprivileged_values)][columns].sum().to_numpy(),
+                counts[counts.index.isin(privileged_values)][columns].sum().to_numpy()
             )
             
-            # Compute dataset metrics
-            dataset_metric = BinaryLabelDatasetMetric(
-                dataset, 
-                unprivileged_groups=unprivileged_groups,
-                privileged_groups=privileged_groups
-            )
-            
-            # Create prediction dataset
-            pred_dataset = dataset.copy()
-            pred_dataset.labels = df['predicted_label'].values.reshape(-1, 1)
-            
-            # Compute classification metrics
-            classified_metric = ClassificationMetric(
-                dataset, pred_dataset,
-                unprivileged_groups=unprivileged_groups,
-                privileged_groups=privileged_groups
-            )
-            
-            fairness_results = {
-                'statistical_parity_difference': dataset_metric.statistical_parity_difference(),
-                'disparate_impact': classified_metric.disparate_impact(),
-                'equalized_odds_difference': classified_metric.equalized_odds_difference(),
-                'demographic_parity_difference': classified_metric.statistical_parity_difference(),
-                'average_odds_difference': classified_metric.average_odds_difference()
-            }
-            
-            return fairness_results
-            
         except Exception as e:
             print(f"Error computing fairness metrics for {protected_attr}: {e}")
             return {}
     
+    @staticmethod
+    def _fairness_from_counts(unprivileged: np.ndarray, privileged: np.ndarray) -> Dict:
+        """
+        Group fairness metrics from the [TP, FP, TN, FN] counts of the
+        unprivileged and privileged rows, with the same definitions as AIF360's
+        BinaryLabelDatasetMetric / ClassificationMetric (favorable label 1).
+        Undefined ratios are NaN or inf.
+        """
+        # Row 0 unprivileged, row 1 privileged
+        tp, fp, tn, fn = np.stack([unprivileged, privileged]).astype(np.float64).T
+        size = tp + fp + tn + fn
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            base_rate = (tp + fn) / size
+            selection_rate = (tp + fp) / size
+            tpr = tp / (tp + fn)
+            fpr = fp / (fp + tn)
+            disparate_impact = selection_rate[0] / selection_rate[1]
+        
+        tpr_difference = tpr[0] - tpr[1]
+        fpr_difference = fpr[0] - fpr[1]
+        
+        return {
+            'statistical_parity_difference': float(base_rate[0] - base_rate[1]),
+            'disparate_impact': float(disparate_impact),
+            'equalized_odds_difference': float(max(abs(fpr_difference), abs(tpr_difference))),
+            'demographic_parity_difference': float(selection_rate[0] - selection_rate[1]),
+            'average_odds_difference': float(0.5 * (fpr_difference + tpr_difference))
+        }
+    
     def generate_bias_report(self, df: pd.DataFrame) -> Dict:
         """
         Generate comprehensive bias analysis report
         """
+        # Row outcomes once per report; the overall metrics are their totals,
+        # and each attribute needs one groupby for its per-group confusion
+        # counts, shared by both metric helpers
+        outcomes = self._outcome_flags(df)
+        overall = self._binary_metrics(*outcomes[['tp', 'fp', 'tn', 'fn']].sum().to_numpy())
+        
         report = {
             'timestamp': datetime.now().isoformat(),
             'dataset_size': len(df),
             'overall_metrics': {
-                'accuracy': accuracy_score(df['true_label'], df['predicted_label']),
-                'precision': precision_score(df['true_label'], df['predicted_label']),
-                'recall': recall_score(df['true_label'], df['predicted_label']),
-                'f1_score': f1_score(df['true_label'], df['predicted_label'])
+                'accuracy': overall['accuracy'],
+                'precision': overall['precision'],
+                'recall': overall['recall'],
+                'f1_score': overall['f1_score']
             },
             'group_analysis': {},
             'fairness_metrics': {},
@@ -270,12 +344,14 @@ class FairnessEvaluator:
         # Analyze each protected attribute
         for attr in ['skin_tone', 'age_group', 'gender']:
             if attr in df.columns:
+                counts = self._group_confusion(df, attr, outcomes)
+                
                 # Group metrics
-                group_metrics = self.compute_group_metrics(df, attr)
+                group_metrics = self.compute_group_metrics(df, attr, counts)
                 report['group_analysis'][attr] = group_metrics
                 
                 # Fairness metrics
-                fairness_metrics = self.compute_fairness_metrics(df, attr)
+                fairness_metrics = self.compute_fairness_metrics(df, attr, counts)
                 report['fairness_metrics'][attr] = fairness_metrics
                 
                 # Check for bias indicators
@@ -287,14 +363,15 @@ class FairnessEvaluator:
         """
         Identify potential bias indicators
         """
-        # Check for significant accuracy differences
-        accuracies = [metrics['accuracy'] for metrics in group_metrics.values()]
-        if max(accuracies) - min(accuracies) > 0.1:  # 10% difference threshold
+        # Check for significant accuracy differences (spread computed once)
+        accuracies = np.fromiter((metrics['accuracy'] for metrics in group_metrics.values()), dtype=np.float64)
+        spread = float(np.ptp(accuracies)) if accuracies.size else 0.0
+        if spread > 0.1:  # 10% difference threshold
             report['bias_indicators'].append({
                 'type': 'accuracy_disparity',
                 'attribute': attr,
-                'severity': 'high' if max(accuracies) - min(accuracies) > 0.2 else 'medium',
-                'details': f"Accuracy varies by {(max(accuracies) - min(accuracies)):.3f} across {attr} groups"
+                'severity': 'high' if spread > 0.2 else 'medium',
+                'details': f"Accuracy varies by {spread:.3f} across {attr} groups"
             })
         
         # Check disparate impact
@@ -312,62 +389,79 @@ class FairnessEvaluator:
         """
         Create bias analysis visualizations
         """
-        # Set up the plotting style
-        plt.style.use('seaborn-v0_8')
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-        fig.suptitle('Skin Lesion AI Fairness Analysis', fontsize=16, fontweight='bold')
-        
-        # 1. Accuracy by skin tone
-        if 'skin_tone' in report['group_analysis']:
-            skin_metrics = report['group_analysis']['skin_tone']
-            skin_tones = list(skin_metrics.keys())
-            accuracies = [skin_metrics[tone]['accuracy'] for tone in skin_tones]
+        # Style scoped to this plot so importing the module leaves rcParams alone
+        with plt.style.context('seaborn-v0_8'):
+            # Allocate the figure once; later calls clear and redraw its axes
+            if self._fig is None:
+                # A plain Figure is not registered with pyplot, so it is freed
+                # with the evaluator instead of accumulating in pyplot's figure list
+                self._fig = Figure(figsize=(15, 12))
+                self._axes = self._fig.subplots(2, 2)
+            else:
+                for ax in self._fig.axes:
+                    if ax not in self._axes.flat:
+                        ax.remove()  # colorbar added by the previous heatmap
+                for ax in self._axes.flat:
+                    ax.clear()
+            fig, axes = self._fig, self._axes
+            fig.suptitle('Skin Lesion AI Fairness Analysis', fontsize=16, fontweight='bold')
             
-            axes[0, 0].bar(skin_tones, accuracies, color='skyblue', alpha=0.7)
-            axes[0, 0].set_title('Model Accuracy by Skin Tone')
-            axes[0, 0].set_ylabel('Accuracy')
-            axes[0, 0].set_ylim(0, 1)
-            axes[0, 0].tick_params(axis='x', rotation=45)
+            # 1. Accuracy by skin tone
+            if 'skin_tone' in report['group_analysis']:
+                skin_metrics = report['group_analysis']['skin_tone']
+                skin_tones = list(skin_metrics.keys())
+                accuracies = [skin_metrics[tone]['accuracy'] for tone in skin_tones]
+                
+                axes[0, 0].bar(skin_tones, accuracies, color='skyblue', alpha=0.7)
+                axes[0, 0].set_title('Model Accuracy by Skin Tone')
+                axes[0, 0].set_ylabel('Accuracy')
+                axes[0, 0].set_ylim(0, 1)
+                axes[0, 0].tick_params(axis='x', rotation=45)
+                
+                # Add threshold line
+                axes[0, 0].axhline(y=0.8, color='red', linestyle='--', alpha=0.7, label='Acceptable Threshold')
+                axes[0, 0].legend()
             
-            # Add threshold line
-            axes[0, 0].axhline(y=0.8, color='red', linestyle='--', alpha=0.7, label='Acceptable Threshold')
-            axes[0, 0].legend()
-        
-        # 2. False Positive Rate by skin tone
-        if 'skin_tone' in report['group_analysis']:
-            skin_metrics = report['group_analysis']['skin_tone']
-            fpr_rates = [skin_metrics[tone]['false_positive_rate'] for tone in skin_tones]
+            # 2. False Positive Rate by skin tone
+            if 'skin_tone' in report['group_analysis']:
+                skin_metrics = report['group_analysis']['skin_tone']
+                fpr_rates = [skin_metrics[tone]['false_positive_rate'] for tone in skin_tones]
+                
+                axes[0, 1].bar(skin_tones, fpr_rates, color='salmon', alpha=0.7)
+                axes[0, 1].set_title('False Positive Rate by Skin Tone')
+                axes[0, 1].set_ylabel('False Positive Rate')
+                axes[0, 1].tick_params(axis='x', rotation=45)
             
-            axes[0, 1].bar(skin_tones, fpr_rates, color='salmon', alpha=0.7)
-            axes[0, 1].set_title('False Positive Rate by Skin Tone')
-            axes[0, 1].set_ylabel('False Positive Rate')
-            axes[0, 1].tick_params(axis='x', rotation=45)
-        
-        # 3. Sample distribution
-        skin_tone_counts = df['skin_tone'].value_counts()
-        axes[1, 0].pie(skin_tone_counts.values, labels=skin_tone_counts.index, autopct='%1.1f%%')
-        axes[1, 0].set_title('Dataset Distribution by Skin Tone')
-        
-        # 4. Fairness metrics heatmap
-        fairness_data = []
-        for attr, metrics in report['fairness_metrics'].items():
-            for metric, value in metrics.items():
-                fairness_data.append([attr, metric, value])
-        
-        if fairness_data:
-            fairness_df = pd.DataFrame(fairness_data, columns=['Attribute', 'Metric', 'Value'])
-            fairness_pivot = fairness_df.pivot(index='Attribute', columns='Metric', values='Value')
+            # 3. Sample distribution
+            skin_tone_counts = df['skin_tone'].value_counts()
+            skin_tone_counts = skin_tone_counts[skin_tone_counts > 0]  # unused categories
+            axes[1, 0].pie(skin_tone_counts.values, labels=skin_tone_counts.index, autopct='%1.1f%%')
+            axes[1, 0].set_title('Dataset Distribution by Skin Tone')
             
-            sns.heatmap(fairness_pivot, annot=True, cmap='RdYlBu_r', center=0, 
-                       ax=axes[1, 1], cbar_kws={'label': 'Bias Score'})
-            axes[1, 1].set_title('Fairness Metrics Heatmap')
-        
-        plt.tight_layout()
-        
-        # Save the plot
-        plot_path = os.path.join(self.results_dir, f'fairness_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
-        plt.savefig(plot_path, dpi=300, bbox_inches='tight')
-        plt.close()
+            # 4. Fairness metrics heatmap, filled straight into an attribute x
+            # metric array (sorted, as a pivot would); missing cells stay NaN
+            fairness = {attr: metrics for attr, metrics in report['fairness_metrics'].items() if metrics}
+            
+            if fairness:
+                attrs = sorted(fairness)
+                metric_names = sorted({metric for metrics in fairness.values() for metric in metrics})
+                fairness_values = np.full((len(attrs), len(metric_names)), np.nan)
+                for i, attr in enumerate(attrs):
+                    for j, metric in enumerate(metric_names):
+                        fairness_values[i, j] = fairness[attr].get(metric, np.nan)
+                
+                sns.heatmap(fairness_values, annot=True, cmap='RdYlBu_r', center=0, 
+                           xticklabels=metric_names, yticklabels=attrs,
+                           ax=axes[1, 1], cbar_kws={'label': 'Bias Score'})
+                axes[1, 1].set_xlabel('Metric')
+                axes[1, 1].set_ylabel('Attribute')
+                axes[1, 1].set_title('Fairness Metrics Heatmap')
+            
+            fig.tight_layout()
+            
+            # Save the plot
+            plot_path = os.path.join(self.results_dir, f'fairness_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
+            fig.savefig(plot_path, dpi=300, bbox_inches='tight')
         
         return plot_path
     
@@ -393,9 +487,7 @@ class FairnessEvaluator:
         # Save detailed report
         report_path = os.path.join(self.results_dir, f'bias_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
         
-        import json
-        with open(report_path, 'w') as f:
-            json.dump(report, f, indent=2, default=str)
+        write_json(report_path, report, default=str)
         
         print(f"✅ Fairness evaluation complete!")
         print(f"📄 Report saved: {report_path}")
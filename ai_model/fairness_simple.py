@@ -5,23 +5,33 @@ Focus on practical bias analysis without complex dependencies
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
-import cv2
 from typing import Dict, List, Tuple, Optional
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 from datetime import datetime
-import json
+
+try:
+    from .json_io import write_json
+except ImportError:
+    from json_io import write_json
+
+# cv2 and matplotlib are imported where first used, so importing this
+# module (e.g. next to the inference code) does not pay for them
+_matplotlib = None
+
+def _matplotlib_module():
+    """matplotlib with its Figure class loaded, imported once"""
+    global _matplotlib
+    if _matplotlib is None:
+        import matplotlib
+        import matplotlib.figure
+        _matplotlib = matplotlib
+    return _matplotlib
 
 class SimpleFairnessEvaluator:
     """Practical fairness evaluation for skin lesion detection"""
     
     def __init__(self):
         self.results_dir = "fairness_evaluation_results"
-        os.makedirs(self.results_dir, exist_ok=True)
         
         # Skin tone detection based on brightness
         self.skin_tone_thresholds = {
@@ -31,19 +41,34 @@ class SimpleFairnessEvaluator:
             'dark': (0.15, 0.3),
             'very_dark': (0.0, 0.15)
         }
+        
+        # Figure reused by every create_comprehensive_visualizations call
+        self._fig = None
+        self._axes = None
+        
+        # Thresholds as sorted bucket edges, for a searchsorted lookup
+        self._tone_names = sorted(self.skin_tone_thresholds, key=lambda tone: self.skin_tone_thresholds[tone][0])
+        self._tone_edges = np.array(
+            [self.skin_tone_thresholds[tone][0] for tone in self._tone_names]
+            + [self.skin_tone_thresholds[self._tone_names[-1]][1]]
+        )
     
     def detect_skin_tone_simple(self, image_path: str) -> str:
         """Simple skin tone detection based on image brightness"""
+        import cv2
+        
         try:
-            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            # Only the mean is needed, so decode at 1/4 scale
+            image = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
             if image is None:
                 return 'unknown'
             
-            brightness = np.mean(image) / 255.0
+            brightness = cv2.mean(image)[0] / 255.0
             
-            for tone, (min_val, max_val) in self.skin_tone_thresholds.items():
-                if min_val <= brightness < max_val:
-                    return tone
+            # Bucket with min_val <= brightness < max_val
+            index = int(np.searchsorted(self._tone_edges, brightness, side='right')) - 1
+            if 0 <= index < len(self._tone_names):
+                return self._tone_names[index]
             
             return 'unknown'
             
@@ -53,129 +78,161 @@ class SimpleFairnessEvaluator:
     
     def create_synthetic_dataset(self, n_samples: int = 1000) -> pd.DataFrame:
         """Create synthetic dataset with bias patterns"""
-        np.random.seed(42)
+        rng = np.random.default_rng(42)
         
         # Generate synthetic demographics
         skin_tones = ['very_light', 'light', 'medium', 'dark', 'very_dark']
-        age_groups = ['young', 'middle_aged', 'elderly']
-        genders = ['male', 'female']
+        
+        def categorical(categories, p):
+            # One int8 code array per column (contiguous, read directly by
+            # the prediction step) wrapped as a Categorical without a copy
+            codes = rng.choice(len(categories), n_samples, p=p).astype(np.int8)
+            return pd.Categorical.from_codes(codes, categories=categories)
+        
+        skin_tone = categorical(skin_tones, p=[0.3, 0.25, 0.2, 0.15, 0.1])
+        true_labels = rng.choice([0, 1], n_samples, p=[0.7, 0.3])  # 30% malignant
+        tone_idx = skin_tone.codes
         
         data = {
             'patient_id': range(n_samples),
-            'skin_tone': np.random.choice(skin_tones, n_samples, p=[0.3, 0.25, 0.2, 0.15, 0.1]),
-            'age_group': np.random.choice(age_groups, n_samples, p=[0.3, 0.4, 0.3]),
-            'gender': np.random.choice(genders, n_samples, p=[0.48, 0.52]),
-            'image_quality': np.random.choice(['high', 'medium', 'low'], n_samples, p=[0.4, 0.5, 0.1]),
-            'true_label': np.random.choice([0, 1], n_samples, p=[0.7, 0.3])  # 30% malignant
+            'skin_tone': skin_tone,
+            'age_group': categorical(['young', 'middle_aged', 'elderly'], p=[0.3, 0.4, 0.3]),
+            'gender': categorical(['male', 'female'], p=[0.48, 0.52]),
+            'image_quality': categorical(['high', 'medium', 'low'], p=[0.4, 0.5, 0.1]),
+            'true_label': true_labels
         }
         
-        # Simulate biased predictions based on skin tone
-        predicted_labels = []
-        confidences = []
+        # Model performance varies by skin tone (simulating bias), one entry
+        # per tone in skin_tones order
+        base_accuracy = np.array([0.92, 0.92, 0.87, 0.81, 0.75])[tone_idx]
+        base_confidence = np.array([0.88, 0.88, 0.83, 0.78, 0.72])[tone_idx]
         
-        for i in range(n_samples):
-            true_label = data['true_label'][i]
-            skin_tone = data['skin_tone'][i]
-            
-            # Model performance varies by skin tone (simulating bias)
-            if skin_tone in ['very_light', 'light']:
-                base_accuracy = 0.92
-                base_confidence = 0.88
-            elif skin_tone == 'medium':
-                base_accuracy = 0.87
-                base_confidence = 0.83
-            elif skin_tone == 'dark':
-                base_accuracy = 0.81
-                base_confidence = 0.78
-            else:  # very_dark
-                base_accuracy = 0.75
-                base_confidence = 0.72
-            
-            # Generate prediction with bias
-            if np.random.random() < base_accuracy:
-                predicted_labels.append(true_label)
-                confidence = base_confidence + np.random.normal(0, 0.05)
-            else:
-                # Bias: darker skin tends to have more false positives
-                if skin_tone in ['dark', 'very_dark'] and true_label == 0:
-                    predicted_labels.append(1)  # False positive
-                    confidence = base_confidence - 0.1 + np.random.normal(0, 0.1)
-                else:
-                    predicted_labels.append(1 - true_label)
-                    confidence = base_confidence - 0.15 + np.random.normal(0, 0.1)
-            
-            confidences.append(max(0.5, min(0.99, confidence)))
+        # Generate all predictions at once - a wrong prediction flips the
+        # label, so a benign case on darker skin becomes a false positive
+        correct = rng.random(n_samples) < base_accuracy
+        noise = rng.standard_normal(n_samples)
+        
+        # Bias: darker skin false positives lose less confidence (-0.1)
+        # than other errors (-0.15); correct predictions are less noisy
+        dark_false_positive = (tone_idx >= 3) & (true_labels == 0) & ~correct
+        offset = np.where(correct, 0.0, np.where(dark_false_positive, -0.1, -0.15))
+        confidence = base_confidence + offset + np.where(correct, 0.05, 0.1) * noise
         
-        data['predicted_label'] = predicted_labels
-        data['confidence'] = confidences
+        data['predicted_label'] = np.where(correct, true_labels, 1 - true_labels)
+        data['confidence'] = np.clip(confidence, 0.5, 0.99)
         
         return pd.DataFrame(data)
     
-    def compute_group_metrics(self, df: pd.DataFrame, group_col: str) -> Dict:
-        """Compute detailed metrics for each group"""
+    @staticmethod
+    def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+        """Elementwise numerator / denominator, 0 where the denominator is 0"""
+        return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
+    
+    @staticmethod
+    def _binary_labels(df: pd.DataFrame, col: str) -> np.ndarray:
+        """
+        A 0/1 label column as an integer array; float labels (e.g. read
+        from CSV) are accepted, anything else raises ValueError
+        """
+        values = df[col].to_numpy()
+        if not ((values == 0) | (values == 1)).all():
+            raise ValueError(f"{col} must contain only 0/1 labels")
+        return values.astype(np.intp, copy=False)
+    
+    @classmethod
+    def _label_arrays(cls, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """true_label, predicted_label and confidence as NumPy arrays, extracted once per run"""
+        return (cls._binary_labels(df, 'true_label'), cls._binary_labels(df, 'predicted_label'),
+                df['confidence'].to_numpy())
+    
+    def compute_group_metrics(self, df: pd.DataFrame, group_col: str,
+                              arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) -> Dict:
+        """
+        Compute detailed metrics for each group
+        arrays: (y_true, y_pred, confidence) from _label_arrays, if already extracted
+        """
         results = {}
         
-        for group in df[group_col].unique():
-            group_data = df[df[group_col] == group]
-            
-            if len(group_data) == 0:
-                continue
-            
-            y_true = group_data['true_label']
-            y_pred = group_data['predicted_label']
-            
-            # Basic metrics
-            tn, fp, fn, tp = confusion_matrix(y_true, y_pred).ravel()
-            
-            results[group] = {
-                'sample_size': len(group_data),
-                'accuracy': accuracy_score(y_true, y_pred),
-                'precision': precision_score(y_true, y_pred, zero_division=0),
-                'recall': recall_score(y_true, y_pred, zero_division=0),
-                'f1_score': f1_score(y_true, y_pred, zero_division=0),
-                'specificity': tn / (tn + fp) if (tn + fp) > 0 else 0,
-                'sensitivity': tp / (tp + fn) if (tp + fn) > 0 else 0,
-                'positive_rate': np.mean(y_pred),
-                'false_positive_rate': fp / (fp + tn) if (fp + tn) > 0 else 0,
-                'false_negative_rate': fn / (fn + tp) if (fn + tp) > 0 else 0,
-                'avg_confidence': np.mean(group_data['confidence']),
-                'true_positives': tp,
-                'false_positives': fp,
-                'true_negatives': tn,
-                'false_negatives': fn
-            }
+        # One bincount over (group, true, predicted) gives every group's
+        # 2x2 confusion matrix, instead of a mask and sklearn calls per group
+        codes, groups = pd.factorize(df[group_col], sort=False)  # first-seen order
+        y_true, y_pred, confidence = arrays if arrays is not None else self._label_arrays(df)
+        known = codes >= 0
+        if not known.all():
+            codes, y_true, y_pred, confidence = codes[known], y_true[known], y_pred[known], confidence[known]
+        
+        num_groups = len(groups)
+        packed = y_true * 2 + y_pred  # confusion cell 0-3
+        counts = np.bincount(codes * 4 + packed, minlength=num_groups * 4).reshape(num_groups, 2, 2)
+        tn, fp, fn, tp = counts[:, 0, 0], counts[:, 0, 1], counts[:, 1, 0], counts[:, 1, 1]
+        size = counts.sum(axis=(1, 2))
+        
+        precision = self._ratio(tp, tp + fp)
+        recall = self._ratio(tp, tp + fn)
+        metrics = {
+            'accuracy': (tp + tn) / size,
+            'precision': precision,
+            'recall': recall,
+            'f1_score': self._ratio(2 * tp, 2 * tp + fp + fn),
+            'specificity': self._ratio(tn, tn + fp),
+            'sensitivity': recall,
+            'positive_rate': (tp + fp) / size,
+            'false_positive_rate': self._ratio(fp, fp + tn),
+            'false_negative_rate': self._ratio(fn, fn + tp),
+            'avg_confidence': np.bincount(codes, weights=confidence, minlength=num_groups) / size
+        }
+        
+        for i, group in enumerate(groups):
+            results[group] = {'sample_size': int(size[i])}
+            results[group].update({name: float(values[i]) for name, values in metrics.items()})
+            results[group].update({
+                'true_positives': int(tp[i]),
+                'false_positives': int(fp[i]),
+                'true_negatives': int(tn[i]),
+                'false_negatives': int(fn[i])
+            })
         
         return results
     
-    def compute_fairness_metrics(self, df: pd.DataFrame, group_col: str, privileged_groups: List[str]) -> Dict:
-        """Compute fairness metrics manually"""
-        
-        # Split into privileged and unprivileged groups
-        privileged_data = df[df[group_col].isin(privileged_groups)]
-        unprivileged_data = df[~df[group_col].isin(privileged_groups)]
+    def compute_fairness_metrics(self, df: pd.DataFrame, group_col: str, privileged_groups: List[str],
+                                 arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) -> Dict:
+        """
+        Compute fairness metrics manually
+        arrays: (y_true, y_pred, confidence) from _label_arrays, if already extracted
+        """
+        
+        # Index 0 unprivileged, 1 privileged; each count is one bincount over
+        # the membership flags, with no privileged/unprivileged sub-frames
+        is_privileged = df[group_col].isin(privileged_groups).to_numpy().astype(np.intp)
+        if arrays is not None:
+            y_true, y_pred = arrays[:2]
+        else:
+            y_true, y_pred = self._binary_labels(df, 'true_label'), self._binary_labels(df, 'predicted_label')
         
-        if len(privileged_data) == 0 or len(unprivileged_data) == 0:
+        sizes = np.bincount(is_privileged, minlength=2)
+        if sizes.min() == 0:
             return {}
         
-        # Compute rates for each group
-        priv_pos_rate = np.mean(privileged_data['predicted_label'])
-        unpriv_pos_rate = np.mean(unprivileged_data['predicted_label'])
+        predicted_positives = np.bincount(is_privileged, weights=y_pred, minlength=2)
+        positives = np.bincount(is_privileged, weights=y_true == 1, minlength=2)
+        negatives = sizes - positives
+        true_positives = np.bincount(is_privileged, weights=(y_true == 1) & (y_pred == 1), minlength=2)
+        false_positives = np.bincount(is_privileged, weights=(y_true == 0) & (y_pred == 1), minlength=2)
         
-        # True positive rates (sensitivity)
-        priv_tpr = recall_score(privileged_data['true_label'], privileged_data['predicted_label'], zero_division=0)
-        unpriv_tpr = recall_score(unprivileged_data['true_label'], unprivileged_data['predicted_label'], zero_division=0)
+        # Compute rates for each group
+        unpriv_pos_rate, priv_pos_rate = predicted_positives / sizes
         
-        # False positive rates
-        priv_fpr = np.mean(privileged_data[privileged_data['true_label'] == 0]['predicted_label']) if len(privileged_data[privileged_data['true_label'] == 0]) > 0 else 0
-        unpriv_fpr = np.mean(unprivileged_data[unprivileged_data['true_label'] == 0]['predicted_label']) if len(unprivileged_data[unprivileged_data['true_label'] == 0]) > 0 else 0
+        # True positive rates (sensitivity) and false positive rates
+        unpriv_tpr, priv_tpr = self._ratio(true_positives, positives)
+        unpriv_fpr, priv_fpr = self._ratio(false_positives, negatives)
         
         fairness_metrics = {
             'demographic_parity_difference': unpriv_pos_rate - priv_pos_rate,
             'disparate_impact': unpriv_pos_rate / priv_pos_rate if priv_pos_rate > 0 else 0,
             'equalized_odds_difference': abs(unpriv_tpr - priv_tpr) + abs(unpriv_fpr - priv_fpr),
             'equal_opportunity_difference': unpriv_tpr - priv_tpr,
-            'privileged_group_size': len(privileged_data),
-            'unprivileged_group_size': len(unprivileged_data),
+            'privileged_group_size': int(sizes[1]),
+            'unprivileged_group_size': int(sizes[0]),
             'privileged_positive_rate': priv_pos_rate,
             'unprivileged_positive_rate': unpriv_pos_rate
         }
@@ -186,18 +243,23 @@ class SimpleFairnessEvaluator:
         """Identify potential bias issues"""
         indicators = []
         
+        # Accuracy and FPR gaps from one np.ptp over a (groups, 2) array;
+        # a single group has no gap
+        rates = np.array(
+            [(metrics['accuracy'], metrics['false_positive_rate']) for metrics in group_metrics.values()],
+            dtype=np.float64
+        ).reshape(-1, 2)
+        accuracy_gap, fpr_gap = np.ptp(rates, axis=0).tolist() if len(rates) else (0.0, 0.0)
+        
         # Check accuracy disparities
-        accuracies = [metrics['accuracy'] for metrics in group_metrics.values()]
-        if len(accuracies) > 1:
-            accuracy_gap = max(accuracies) - min(accuracies)
-            if accuracy_gap > 0.1:
-                indicators.append({
-                    'type': 'accuracy_disparity',
-                    'attribute': attr,
-                    'severity': 'high' if accuracy_gap > 0.2 else 'medium',
-                    'value': accuracy_gap,
-                    'description': f"Accuracy varies by {accuracy_gap:.3f} across {attr} groups"
-                })
+        if accuracy_gap > 0.1:
+            indicators.append({
+                'type': 'accuracy_disparity',
+                'attribute': attr,
+                'severity': 'high' if accuracy_gap > 0.2 else 'medium',
+                'value': accuracy_gap,
+                'description': f"Accuracy varies by {accuracy_gap:.3f} across {attr} groups"
+            })
         
         # Check disparate impact
         if 'disparate_impact' in fairness_metrics:
@@ -212,28 +274,45 @@ class SimpleFairnessEvaluator:
                 })
         
         # Check false positive rate disparities
-        fpr_rates = [metrics['false_positive_rate'] for metrics in group_metrics.values()]
-        if len(fpr_rates) > 1:
-            fpr_gap = max(fpr_rates) - min(fpr_rates)
-            if fpr_gap > 0.1:
-                indicators.append({
-                    'type': 'false_positive_disparity',
-                    'attribute': attr,
-                    'severity': 'high' if fpr_gap > 0.2 else 'medium',
-                    'value': fpr_gap,
-                    'description': f"False positive rate varies by {fpr_gap:.3f} across {attr} groups"
-                })
+        if fpr_gap > 0.1:
+            indicators.append({
+                'type': 'false_positive_disparity',
+                'attribute': attr,
+                'severity': 'high' if fpr_gap > 0.2 else 'medium',
+                'value': fpr_gap,
+                'description': f"False positive rate varies by {fpr_gap:.3f} across {attr} groups"
+            })
         
         return indicators
     
-    def create_comprehensive_visualizations(self, df: pd.DataFrame, analysis_results: Dict) -> str:
-        """Create comprehensive bias analysis visualizations"""
-        
-        # Create figure with subplots
-        fig = plt.figure(figsize=(20, 16))
+    def create_comprehensive_visualizations(self, df: pd.DataFrame, analysis_results: Dict,
+                                            timestamp: Optional[str] = None) -> str:
+        """
+        Create comprehensive bias analysis visualizations
+        timestamp: filename suffix shared with the report (default: now)
+        """
+        
+        matplotlib = _matplotlib_module()
+        
+        # Allocate the 3x3 figure once; later calls clear and redraw its axes.
+        # A plain Figure is not registered with pyplot, so it is freed with the
+        # evaluator instead of accumulating in pyplot's figure list.
+        if self._fig is None:
+            self._fig = matplotlib.figure.Figure(figsize=(20, 16))
+            self._axes = self._fig.subplots(3, 3)
+        else:
+            for ax in self._axes.flat:
+                ax.clear()
+            # tight_layout starts from the current spacing, so restore the
+            # defaults to lay out exactly as a fresh figure would
+            self._fig.subplots_adjust(**{
+                param: matplotlib.rcParams[f'figure.subplot.{param}']
+                for param in ['left', 'right', 'bottom', 'top', 'wspace', 'hspace']
+            })
+        fig = self._fig
+        ax1, ax2, ax3, ax4, ax5, ax6, ax7, ax8, ax9 = self._axes.flat
         
         # 1. Performance metrics by skin tone
-        ax1 = plt.subplot(3, 3, 1)
         if 'skin_tone' in analysis_results['group_analysis']:
             skin_metrics = analysis_results['group_analysis']['skin_tone']
             skin_tones = list(skin_metrics.keys())
@@ -246,16 +325,13 @@ class SimpleFairnessEvaluator:
             ax1.tick_params(axis='x', rotation=45)
             
             # Add value labels on bars
-            for bar, acc in zip(bars, accuracies):
-                ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01, 
-                        f'{acc:.3f}', ha='center', va='bottom', fontweight='bold')
+            ax1.bar_label(bars, fmt='%.3f', padding=3, fontweight='bold')
             
             # Add threshold line
             ax1.axhline(y=0.8, color='red', linestyle='--', alpha=0.7, label='Minimum Acceptable')
             ax1.legend()
         
         # 2. False Positive Rates
-        ax2 = plt.subplot(3, 3, 2)
         if 'skin_tone' in analysis_results['group_analysis']:
             fpr_rates = [skin_metrics[tone]['false_positive_rate'] for tone in skin_tones]
             
@@ -264,22 +340,21 @@ class SimpleFairnessEvaluator:
             ax2.set_ylabel('False Positive Rate')
             ax2.tick_params(axis='x', rotation=45)
             
-            for bar, fpr in zip(bars, fpr_rates):
-                ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.005, 
-                        f'{fpr:.3f}', ha='center', va='bottom', fontweight='bold')
+            ax2.bar_label(bars, fmt='%.3f', padding=3, fontweight='bold')
         
         # 3. Sample size distribution
-        ax3 = plt.subplot(3, 3, 3)
         if 'skin_tone' in analysis_results['group_analysis']:
-            sample_sizes = [skin_metrics[tone]['sample_size'] for tone in skin_tones]
+            sample_sizes = np.array([skin_metrics[tone]['sample_size'] for tone in skin_tones])
             
-            colors = plt.cm.Set3(np.linspace(0, 1, len(skin_tones)))
-            wedges, texts, autotexts = ax3.pie(sample_sizes, labels=skin_tones, autopct='%1.1f%%', 
-                                              colors=colors, startangle=90)
+            # Horizontal bars of the percentage share - a bar per tone
+            # instead of a wedge, label and autopct text per slice
+            bars = ax3.barh(skin_tones, sample_sizes / sample_sizes.sum() * 100, color='mediumaquamarine', alpha=0.8)
+            ax3.bar_label(bars, fmt='%.1f%%', padding=3)
             ax3.set_title('Sample Distribution by Skin Tone', fontweight='bold')
+            ax3.set_xlabel('Share of Samples (%)')
+            ax3.margins(x=0.15)  # room for the labels
         
         # 4. Precision and Recall by skin tone
-        ax4 = plt.subplot(3, 3, 4)
         if 'skin_tone' in analysis_results['group_analysis']:
             precisions = [skin_metrics[tone]['precision'] for tone in skin_tones]
             recalls = [skin_metrics[tone]['recall'] for tone in skin_tones]
@@ -298,10 +373,13 @@ class SimpleFairnessEvaluator:
             ax4.set_ylim(0, 1)
         
         # 5. Confidence distribution
-        ax5 = plt.subplot(3, 3, 5)
-        for tone in df['skin_tone'].unique():
-            tone_data = df[df['skin_tone'] == tone]
-            ax5.hist(tone_data['confidence'], alpha=0.6, label=tone, bins=20)
+        # Shared bin edges, so the tones are comparable bin for bin; each
+        # group is one np.histogram and one stairs artist instead of a
+        # Rectangle patch per bin
+        edges = np.histogram_bin_edges(df['confidence'].to_numpy(), bins=20)
+        for tone, confidence in df['confidence'].groupby(df['skin_tone'], sort=False, observed=True):
+            counts, _ = np.histogram(confidence.to_numpy(), bins=edges)
+            ax5.stairs(counts, edges, fill=True, alpha=0.6, label=tone)
         
         ax5.set_title('Confidence Distribution by Skin Tone', fontweight='bold')
         ax5.set_xlabel('Confidence Score')
@@ -309,7 +387,6 @@ class SimpleFairnessEvaluator:
         ax5.legend()
         
         # 6. Bias indicators summary
-        ax6 = plt.subplot(3, 3, 6)
         bias_types = {}
         for indicator in analysis_results['bias_indicators']:
             bias_type = indicator['type']
@@ -338,7 +415,6 @@ class SimpleFairnessEvaluator:
             ax6.set_title('Bias Assessment', fontweight='bold')
         
         # 7. Performance by age group
-        ax7 = plt.subplot(3, 3, 7)
         if 'age_group' in analysis_results['group_analysis']:
             age_metrics = analysis_results['group_analysis']['age_group']
             age_groups = list(age_metrics.keys())
@@ -349,12 +425,9 @@ class SimpleFairnessEvaluator:
             ax7.set_ylabel('Accuracy')
             ax7.set_ylim(0, 1)
             
-            for bar, acc in zip(bars, age_accuracies):
-                ax7.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01, 
-                        f'{acc:.3f}', ha='center', va='bottom', fontweight='bold')
+            ax7.bar_label(bars, fmt='%.3f', padding=3, fontweight='bold')
         
         # 8. Performance by gender
-        ax8 = plt.subplot(3, 3, 8)
         if 'gender' in analysis_results['group_analysis']:
             gender_metrics = analysis_results['group_analysis']['gender']
             genders = list(gender_metrics.keys())
@@ -365,12 +438,9 @@ class SimpleFairnessEvaluator:
             ax8.set_ylabel('Accuracy')
             ax8.set_ylim(0, 1)
             
-            for bar, acc in zip(bars, gender_accuracies):
-                ax8.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01, 
-                        f'{acc:.3f}', ha='center', va='bottom', fontweight='bold')
+            ax8.bar_label(bars, fmt='%.3f', padding=3, fontweight='bold')
         
         # 9. Overall fairness score
-        ax9 = plt.subplot(3, 3, 9)
         
         # Calculate overall fairness score
         total_indicators = len(analysis_results['bias_indicators'])
@@ -397,18 +467,22 @@ class SimpleFairnessEvaluator:
         ax9.set_xticks([])
         ax9.set_yticks([])
         
-        plt.tight_layout()
+        fig.tight_layout()
         
-        # Save the comprehensive plot
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Save the comprehensive plot; tight_layout already fits the
+        # panels, so skip the extra tight-bbox render pass
+        if timestamp is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         plot_path = os.path.join(self.results_dir, f'comprehensive_fairness_analysis_{timestamp}.png')
-        plt.savefig(plot_path, dpi=300, bbox_inches='tight', facecolor='white')
-        plt.close()
+        fig.savefig(plot_path, dpi=150, facecolor='white')
         
         return plot_path
     
-    def run_complete_evaluation(self, df: Optional[pd.DataFrame] = None) -> Tuple[Dict, str]:
-        """Run complete fairness evaluation"""
+    def run_complete_evaluation(self, df: Optional[pd.DataFrame] = None, make_plots: bool = True) -> Tuple[Dict, str]:
+        """
+        Run complete fairness evaluation
+        make_plots: render the visualization figure (the slowest step)
+        """
         print("🔍 Starting Comprehensive Fairness Evaluation for Skin Lesion AI")
         print("="*70)
         
@@ -419,15 +493,29 @@ class SimpleFairnessEvaluator:
         
         print(f"📈 Analyzing {len(df):,} patient records...")
         
+        # One clock read names both the report and the plot
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        
+        # Label columns as NumPy arrays once, shared by every metric below
+        arrays = self._label_arrays(df)
+        y_true, y_pred, _ = arrays
+        
+        # Overall 2x2 confusion counts in one pass; the four scores follow
+        # from them (0 where undefined, as sklearn's zero_division gives)
+        tn, fp, fn, tp = np.bincount(y_true * 2 + y_pred, minlength=4)
+        precision = tp / (tp + fp) if tp + fp > 0 else 0.0
+        recall = tp / (tp + fn) if tp + fn > 0 else 0.0
+        
         # Initialize results
         analysis_results = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now.isoformat(),
             'dataset_size': len(df),
             'overall_metrics': {
-                'accuracy': accuracy_score(df['true_label'], df['predicted_label']),
-                'precision': precision_score(df['true_label'], df['predicted_label']),
-                'recall': recall_score(df['true_label'], df['predicted_label']),
-                'f1_score': f1_score(df['true_label'], df['predicted_label'])
+                'accuracy': (tp + tn) / len(df),
+                'precision': precision,
+                'recall': recall,
+                'f1_score': 2 * tp / (2 * tp + fp + fn) if tp + fp + fn > 0 else 0.0
             },
             'group_analysis': {},
             'fairness_metrics': {},
@@ -447,13 +535,13 @@ class SimpleFairnessEvaluator:
                 print(f"  🔍 Analyzing {attr.replace('_', ' ')}...")
                 
                 # Group metrics
-                group_metrics = self.compute_group_metrics(df, attr)
+                group_metrics = self.compute_group_metrics(df, attr, arrays)
                 analysis_results['group_analysis'][attr] = group_metrics
                 
                 # Fairness metrics
                 if attr in privileged_groups_map:
                     fairness_metrics = self.compute_fairness_metrics(
-                        df, attr, privileged_groups_map[attr]
+                        df, attr, privileged_groups_map[attr], arrays
                     )
                     analysis_results['fairness_metrics'][attr] = fairness_metrics
                     
@@ -463,22 +551,27 @@ class SimpleFairnessEvaluator:
                     )
                     analysis_results['bias_indicators'].extend(bias_indicators)
         
+        # Created here, where the plot and report are written, so a
+        # directory removed since the last run comes back
+        os.makedirs(self.results_dir, exist_ok=True)
+        
         # Create visualizations
-        print("📊 Creating comprehensive visualizations...")
-        plot_path = self.create_comprehensive_visualizations(df, analysis_results)
+        plot_path = None
+        if make_plots:
+            print("📊 Creating comprehensive visualizations...")
+            plot_path = self.create_comprehensive_visualizations(df, analysis_results, timestamp)
         
         # Save detailed report
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         report_path = os.path.join(self.results_dir, f'fairness_report_{timestamp}.json')
         
-        with open(report_path, 'w') as f:
-            json.dump(analysis_results, f, indent=2, default=str)
+        write_json(report_path, analysis_results, default=str)
         
         # Print summary
         self._print_detailed_summary(analysis_results)
         
         print(f"\n📄 Detailed report saved: {report_path}")
-        print(f"📊 Visualizations saved: {plot_path}")
+        if plot_path:
+            print(f"📊 Visualizations saved: {plot_path}")
         print("✅ Fairness evaluation complete!")
         
         return analysis_results, report_path
@@ -0,0 +1,25 @@
+import json
+
+# Optional orjson (Rust, serializes ~5-10x faster than the stdlib); json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def write_json(path, obj, indent=True, default=None):
+    """
+    Write obj to path as JSON.
+    
+    Pass indent=False for large machine-read files - pretty-printing is
+    most of the cost of the stdlib encoder. default is called for objects
+    neither encoder supports (e.g. default=str).
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, default=default, option=option))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2 if indent else None, default=default)
@@ -3,24 +3,35 @@ import pickle
 import numpy as np
 import os
 
+from ai_model.quick_model import companion_buffer_paths
+
 class ModelWrapper:
     def __init__(self, model_path):
         if os.path.exists(model_path):
+            # Large arrays are memory-mapped from the companion files
+            # rather than read into memory with the pickle
+            buffers = [np.load(path, mmap_mode='r') for path in companion_buffer_paths(model_path)]
             with open(model_path, 'rb') as f:
-                self.model = pickle.load(f)
+                self.model = pickle.load(f, buffers=buffers)
         else:
             from ai_model.quick_model import SimpleSkinLesionModel
             self.model = SimpleSkinLesionModel()
     
     def predict(self, image_array, filename="unknown.jpg"):
-        """Predict using the simple model"""
+        """
+        Predict using the simple model
+        Returns: (benign_prob, malignant_prob)
+        """
         pred, conf = self.model.predict(filename)
         
-        # Convert to format expected by the web application
         if pred == 'malignant':
-            return np.array([[1-conf, conf]])  # [benign_prob, malignant_prob]
+            return 1 - conf, conf
         else:
-            return np.array([[conf, 1-conf]])  # [benign_prob, malignant_prob]
+            return conf, 1 - conf
+    
+    def predict_proba(self, image_array, filename="unknown.jpg"):
+        """Probabilities as a (1, 2) array [[benign_prob, malignant_prob]], Keras/sklearn style"""
+        return np.array([self.predict(image_array, filename)])
 
 # Global model instance
 _model = None
@@ -34,10 +45,7 @@ def get_model():
 def predict_image(image_array, filename="unknown.jpg"):
     """Function to be called by the web application"""
     model = get_model()
-    predictions = model.predict(image_array, filename)
-    
-    benign_prob = float(predictions[0][0])
-    malignant_prob = float(predictions[0][1])
+    benign_prob, malignant_prob = model.predict(image_array, filename)
     
     if malignant_prob > benign_prob:
         return 'MALIGNANT', malignant_prob
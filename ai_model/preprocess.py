@@ -1,123 +1,230 @@
+import io
+import os
+import threading
 import cv2
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from PIL import Image, ImageEnhance
-import random
+from PIL import Image
 
-def resize_image(image, size=(224, 224)):
+# Optional libjpeg-turbo decoder (SIMD IDCT/colour conversion); OpenCV is the fallback
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError, OSError):  # package or libturbojpeg not installed
+    _turbo_jpeg = None
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# Bump whenever preprocess_image output changes, so cached decodes are rebuilt
+PREPROCESS_VERSION = 6
+
+# Decoders round differently, so caches record which one built them
+JPEG_DECODER = 'turbojpeg' if _turbo_jpeg is not None else 'opencv'
+
+EXIF_ORIENTATION = 0x0112
+
+def resize_image(image, size=(224, 224), interpolation=None):
     """
     Resize image to target size with proper aspect ratio handling.
+    
+    By default shrinking uses INTER_AREA (pixel averaging, so no aliasing)
+    and enlarging uses INTER_CUBIC; pass interpolation= to override, e.g.
+    cv2.INTER_LANCZOS4.
     """
-    return cv2.resize(image, size, interpolation=cv2.INTER_LANCZOS4)
+    if interpolation is None:
+        h, w = image.shape[:2]
+        interpolation = cv2.INTER_AREA if size[0] < w and size[1] < h else cv2.INTER_CUBIC
+    return cv2.resize(image, size, interpolation=interpolation)
 
-def normalize_image(image):
+def normalize_image(image, out=None):
     """
     Normalize image to range [0, 1].
+    
+    Converts and scales in a single pass (no intermediate float copy);
+    pass out= to write into a preallocated float32 buffer.
     """
-    return image.astype("float32") / 255.0
+    return np.divide(image, 255.0, out=out, dtype=np.float32)
+
+# Per-thread state: one CLAHE object (the parameters never change, but an
+# instance keeps internal buffers, so batch threads must not share one) and
+# one random generator for augmentation
+_thread_state = threading.local()
+
+def _get_clahe():
+    """Return this thread's CLAHE instance, creating it on first use"""
+    clahe = getattr(_thread_state, 'clahe', None)
+    if clahe is None:
+        clahe = _thread_state.clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    return clahe
+
+def _get_rng():
+    """Return this thread's NumPy generator, creating it on first use"""
+    rng = getattr(_thread_state, 'rng', None)
+    if rng is None:
+        rng = _thread_state.rng = np.random.default_rng()
+    return rng
 
 def lighting_correction(image):
     """
     Apply lighting normalization using CLAHE (Contrast Limited Adaptive Histogram Equalization).
     Works well for uneven smartphone image lighting.
     """
-    if len(image.shape) == 3 and image.shape[2] == 3:  # color image
-        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        cl = clahe.apply(l)
-        limg = cv2.merge((cl, a, b))
-        corrected = cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
-        return corrected
+    if len(image.shape) == 3 and image.shape[2] == 3:  # color image (RGB)
+        # CLAHE on the L channel, written back into the LAB image in place
+        lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
+        lab[:, :, 0] = _get_clahe().apply(np.ascontiguousarray(lab[:, :, 0]))
+        return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
     else:  # grayscale
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        return clahe.apply(image)
+        return _get_clahe().apply(image)
+
+# 9x9 black-hat kernel for hair detection; OpenCV applies a rectangular
+# kernel as separate row and column passes, so it costs 18 taps, not 81
+HAIR_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
 
 def remove_hair_artifacts(image):
     """
     Remove hair artifacts using morphological operations.
+    Expects RGB (or grayscale) input, as preprocess_image loads it.
     """
     if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
     else:
-        gray = image.copy()
-    
-    # Create kernel for hair removal
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
+        gray = image
     
     # Black hat operation to detect hair
-    blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel)
+    blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, HAIR_KERNEL)
     
     # Threshold to create hair mask
     _, hair_mask = cv2.threshold(blackhat, 10, 255, cv2.THRESH_BINARY)
     
-    # Inpaint to remove hair
-    if len(image.shape) == 3:
-        result = cv2.inpaint(image, hair_mask, 1, cv2.INPAINT_TELEA)
-    else:
-        result = cv2.inpaint(image, hair_mask, 1, cv2.INPAINT_TELEA)
-    
-    return result
+    # Inpaint to remove hair; with nothing to fill, skip inpaint's full-image setup.
+    # Navier-Stokes is ~1.5x faster than Telea here and fills thin hairs about as well
+    if cv2.countNonZero(hair_mask) == 0:
+        return image.copy()
+    return cv2.inpaint(image, hair_mask, 1, cv2.INPAINT_NS)
 
-def augment_image(image, strong=False):
+def augment_image(image, strong=False, rng=None):
     """
     Apply data augmentation to image.
     
     Args:
-        image: Input image (0-1 normalized)
+        image: Input image (0-1 normalized float, or uint8)
         strong: Whether to apply stronger augmentations
+        rng: NumPy Generator for reproducible augmentation (default: a
+            generator private to the calling thread)
+    
+    Returns an image of the same kind as the input (float32 in [0, 1] or uint8).
+    All steps run on one float32 copy: the colour changes update it in
+    place, flips are views, and it is clipped once at the end.
+    
+    This is a library/test helper for single NumPy images; training does not
+    call it and augments inside the tf.data pipeline (data_loader._finish_pipeline).
     """
-    # Convert to PIL for augmentation
-    img_pil = Image.fromarray((image * 255).astype(np.uint8))
+    is_uint8 = image.dtype == np.uint8
+    scale = 255.0 if is_uint8 else 1.0
+    img = np.array(image, dtype=np.float32)
     
-    # Random rotation
-    if random.random() > 0.5:
-        angle = random.uniform(-15, 15) if not strong else random.uniform(-30, 30)
-        img_pil = img_pil.rotate(angle, fillcolor=(128, 128, 128))
+    # All random numbers in one draw: four coin flips, then four values in
+    # [-1, 1) that scale the angle and the brightness/contrast/saturation changes
+    draws = (rng if rng is not None else _get_rng()).random(8).tolist()
+    do_rotate, do_flip_lr, do_flip_ud, do_color = draws[:4]
+    angle, brightness, contrast, saturation = (2 * d - 1 for d in draws[4:])
     
-    # Random flip
-    if random.random() > 0.5:
-        img_pil = img_pil.transpose(Image.FLIP_LEFT_RIGHT)
-    
-    if random.random() > 0.7:
-        img_pil = img_pil.transpose(Image.FLIP_TOP_BOTTOM)
-    
-    # Color augmentations
-    if random.random() > 0.3:
-        # Brightness
-        enhancer = ImageEnhance.Brightness(img_pil)
-        factor = random.uniform(0.8, 1.2) if not strong else random.uniform(0.6, 1.4)
-        img_pil = enhancer.enhance(factor)
+    # Random rotation (counter-clockwise about the centre, nearest pixel, grey fill)
+    if do_rotate > 0.5:
+        angle *= 30 if strong else 15
+        h, w = img.shape[:2]
+        matrix = cv2.getRotationMatrix2D(((w - 1) / 2, (h - 1) / 2), angle, 1.0)
+        img = cv2.warpAffine(img, matrix, (w, h), flags=cv2.INTER_NEAREST,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=(0.5 * scale,) * 3)
+    
+    # Color augmentations, blending as PIL's ImageEnhance does. They don't
+    # depend on pixel order, so they run before the flips on contiguous memory
+    if do_color > 0.3:
+        # Brightness: blend with black
+        factor = 1 + brightness * (0.4 if strong else 0.2)
+        img *= factor
         
-        # Contrast
-        enhancer = ImageEnhance.Contrast(img_pil)
-        factor = random.uniform(0.8, 1.2) if not strong else random.uniform(0.6, 1.4)
-        img_pil = enhancer.enhance(factor)
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
         
-        # Saturation
-        enhancer = ImageEnhance.Color(img_pil)
-        factor = random.uniform(0.8, 1.2) if not strong else random.uniform(0.5, 1.5)
-        img_pil = enhancer.enhance(factor)
+        # Contrast: blend with the mean grey level
+        factor = 1 + contrast * (0.4 if strong else 0.2)
+        mean = gray.mean()
+        img -= mean
+        img *= factor
+        img += mean
+        
+        # Saturation: blend with the greyscale image
+        factor = 1 + saturation * (0.5 if strong else 0.2)
+        if img.ndim == 3:
+            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)[..., np.newaxis]
+            img -= gray
+            img *= factor
+            img += gray
+    
+    # Random flip
+    if do_flip_lr > 0.5:
+        img = img[:, ::-1]
+    
+    if do_flip_ud > 0.7:
+        img = img[::-1]
     
-    # Convert back to numpy and normalize
-    augmented = np.array(img_pil)
-    return augmented.astype("float32") / 255.0
+    np.clip(img, 0, scale, out=img)
+    if is_uint8:
+        return np.rint(img).astype(np.uint8)
+    return img
+
+def _exif_orientation(data):
+    """EXIF orientation tag of an encoded image (1 = upright, also when absent)"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:  # lazy: reads the headers only
+            return img.getexif().get(EXIF_ORIENTATION, 1)
+    except (OSError, ValueError, SyntaxError):
+        return 1
 
-def preprocess_image(image_path, size=(224, 224), remove_hair=True):
+def load_image_rgb(image_path):
+    """
+    Load an image as an RGB uint8 array, or None if it cannot be read.
+    The file is read once and decoded from memory - with libjpeg-turbo
+    for upright JPEGs when available, otherwise cv2.imdecode. OpenCV
+    applies the EXIF orientation and libjpeg-turbo does not, so rotated
+    (e.g. phone) JPEGs always go to OpenCV and come out the same way up.
+    """
+    try:
+        buf = np.fromfile(image_path, dtype=np.uint8)
+    except OSError:
+        return None
+    if buf.size == 0:
+        return None
+    
+    if _turbo_jpeg is not None and os.path.splitext(image_path)[1].lower() in JPEG_EXTENSIONS:
+        data = buf.tobytes()
+        try:
+            if _exif_orientation(data) == 1:
+                return _turbo_jpeg.decode(data, pixel_format=TJPF_RGB)
+        except (OSError, ValueError):
+            pass  # let OpenCV have a go / report the failure
+    
+    image = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def preprocess_image(image_path, size=(224, 224), remove_hair=True, normalize=True):
     """
     Full preprocessing pipeline:
     1. Load image
     2. Hair artifact removal (optional)
     3. Lighting normalization
     4. Resize
-    5. Normalize
+    5. Normalize (optional - with normalize=False the uint8 image is returned,
+       which is 4x smaller to store and can be normalized later)
     """
-    image = cv2.imread(image_path)
+    # Load as RGB for consistency
+    image = load_image_rgb(image_path)
     if image is None:
         raise ValueError(f"Unable to load image: {image_path}")
     
-    # Convert BGR to RGB for consistency
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    
     # Remove hair artifacts
     if remove_hair:
         image = remove_hair_artifacts(image)
@@ -129,22 +236,59 @@ def preprocess_image(image_path, size=(224, 224), remove_hair=True):
     image = resize_image(image, size)
     
     # Normalize to [0, 1]
-    image = normalize_image(image)
+    if normalize:
+        image = normalize_image(image)
     
     return image
 
-def preprocess_batch(image_paths, size=(224, 224), remove_hair=True):
+def _preprocess_one(task):
+    """
+    Preprocess a single image to uint8 for preprocess_batch.
+    
+    Returns: (image, error)
+    """
+    img_path, size, remove_hair = task
+    try:
+        return preprocess_image(img_path, size=size, remove_hair=remove_hair, normalize=False), None
+    except Exception as e:
+        return None, str(e)
+
+def _preprocess_results(tasks, num_workers=None):
+    """
+    Yield _preprocess_one results in task order, on a thread pool (OpenCV
+    releases the GIL) unless num_workers == 1.
+    """
+    if num_workers == 1 or len(tasks) <= 1:
+        yield from map(_preprocess_one, tasks)
+        return
+    
+    # Parallelism is across images, so keep OpenCV's own threads out of it
+    opencv_threads = cv2.getNumThreads()
+    cv2.setNumThreads(1)
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+            yield from executor.map(_preprocess_one, tasks)
+    finally:
+        cv2.setNumThreads(opencv_threads)
+
+def preprocess_batch(image_paths, size=(224, 224), remove_hair=True, num_workers=None):
     """
     Preprocess a batch of images efficiently.
+    
+    Images are processed in parallel (num_workers=1 for serial) and each
+    is normalized straight into its slot of a preallocated (N, H, W, 3)
+    float32 array. Unreadable images are left out and listed in failed.
     """
-    images = []
+    tasks = [(img_path, size, remove_hair) for img_path in image_paths]
+    images = np.empty((len(tasks), size[1], size[0], 3), dtype=np.float32)
     failed = []
     
-    for img_path in image_paths:
-        try:
-            image = preprocess_image(img_path, size=size, remove_hair=remove_hair)
-            images.append(image)
-        except Exception as e:
-            failed.append((img_path, str(e)))
+    count = 0
+    for (img_path, _, _), (image, error) in zip(tasks, _preprocess_results(tasks, num_workers)):
+        if image is None:
+            failed.append((img_path, error))
+            continue
+        normalize_image(image, out=images[count])
+        count += 1
     
-    return np.array(images), failed
+    return images[:count], failed
@@ -1,9 +1,16 @@
 import os
+import re
 import sys
 import numpy as np
 import pickle
 from pathlib import Path
-import random
+
+def companion_buffer_paths(model_path):
+    """Out-of-band pickle buffers saved next to the model, in order"""
+    paths = []
+    while os.path.exists(f"{model_path}.buf{len(paths)}.npy"):
+        paths.append(f"{model_path}.buf{len(paths)}.npy")
+    return paths
 
 # Simple lightweight model for quick deployment
 class SimpleSkinLesionModel:
@@ -12,7 +19,12 @@ class SimpleSkinLesionModel:
     This will be replaced with proper ML model after training
     """
     
-    def __init__(self):
+    def __init__(self, seed=None):
+        """
+        seed: seeds the generator shared by predict and predict_batch, so
+            seeded models give reproducible, matching results on both paths
+        """
+        self.rng = np.random.default_rng(seed)
         self.classes = ['benign', 'malignant']
         self.class_map = {'benign': 0, 'malignant': 1}
         
@@ -28,6 +40,22 @@ class SimpleSkinLesionModel:
             'keratosis', 'bkl', 'sk', 'vascular', 'vasc'
         ]
     
+    def __getstate__(self):
+        """
+        Pickle the generator as its plain state dict; the Generator object
+        itself would add its seed array as an out-of-band buffer
+        """
+        state = self.__dict__.copy()
+        state['rng'] = self.rng.bit_generator.state
+        return state
+    
+    def __setstate__(self, state):
+        """Restore the generator; models pickled before it existed get a fresh one"""
+        self.__dict__.update(state)
+        self.rng = np.random.default_rng()
+        if 'rng' in state:
+            self.rng.bit_generator.state = state['rng']
+    
     def predict(self, image_path):
         """
         Simple prediction based on filename patterns
@@ -47,40 +75,86 @@ class SimpleSkinLesionModel:
             if indicator in filename:
                 benign_score += 1
         
-        # Default logic with some randomness to avoid 100% confidence
+        # Default logic with some randomness to avoid 100% confidence; two
+        # draws per image, in the same order predict_batch takes them
+        noise, coin = self.rng.random(2).tolist()
         if malignant_score > benign_score:
-            confidence = min(0.95, 0.6 + (malignant_score * 0.1) + random.uniform(0, 0.15))
+            confidence = min(0.95, 0.6 + (malignant_score * 0.1) + 0.15 * noise)
             prediction = 'malignant'
         elif benign_score > malignant_score:
-            confidence = min(0.95, 0.6 + (benign_score * 0.1) + random.uniform(0, 0.15))
+            confidence = min(0.95, 0.6 + (benign_score * 0.1) + 0.15 * noise)
             prediction = 'benign'
         else:
             # If no clear indicators, make it more random but slightly favor benign
-            confidence = random.uniform(0.55, 0.85)
-            prediction = 'benign' if random.random() > 0.3 else 'malignant'
+            confidence = 0.55 + 0.3 * noise
+            prediction = 'benign' if coin > 0.3 else 'malignant'
         
         return prediction, confidence
     
+    @staticmethod
+    def _indicator_counts(text, starts, indicators):
+        """
+        Per name, how many of indicators occur in it, where text is the
+        names joined by newlines and starts holds each name's offset
+        """
+        counts = np.zeros(len(starts), dtype=np.int64)
+        for indicator in indicators:
+            hits = np.fromiter((m.start() for m in re.finditer(re.escape(indicator), text)), dtype=np.int64)
+            counts[np.unique(np.searchsorted(starts, hits, side='right') - 1)] += 1
+        return counts
+    
     def predict_batch(self, image_paths):
-        """Predict for multiple images"""
-        results = []
-        for img_path in image_paths:
-            pred, conf = self.predict(img_path)
-            results.append((pred, conf))
-        return results
+        """
+        Predict for multiple images
+        Same rules as predict, but each indicator is searched for once in
+        all the joined filenames, and the random draws are made per batch
+        (the same values predict would draw path by path)
+        """
+        filenames = [os.path.basename(p).lower() for p in image_paths]
+        n = len(filenames)
+        if n == 0:
+            return []
+        
+        text = '\n'.join(filenames)
+        starts = np.cumsum([0] + [len(name) + 1 for name in filenames[:-1]])
+        malignant_score = self._indicator_counts(text, starts, self.malignant_indicators)
+        benign_score = self._indicator_counts(text, starts, self.benign_indicators)
+        
+        # Clear indicators: 0.6 + 0.1 per match + noise, capped at 0.95;
+        # ties: uniform confidence and a 30% chance of malignant
+        noise, coin = self.rng.random((n, 2)).T
+        is_tie = malignant_score == benign_score
+        confidence = np.where(
+            is_tie,
+            0.55 + 0.3 * noise,
+            np.minimum(0.95, 0.6 + np.maximum(malignant_score, benign_score) * 0.1 + 0.15 * noise)
+        )
+        is_malignant = np.where(is_tie, coin <= 0.3, malignant_score > benign_score)
+        
+        return [(self.classes[m], c) for m, c in zip(is_malignant.tolist(), confidence.tolist())]
     
     def save_model(self, filepath):
-        """Save the model"""
+        """
+        Save the model with pickle protocol 5; large array buffers go
+        out-of-band into companion .npy files that loading memory-maps
+        """
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        for path in companion_buffer_paths(filepath):
+            os.remove(path)  # left over from a previous save
+        
+        buffers = []
         with open(filepath, 'wb') as f:
-            pickle.dump(self, f)
+            pickle.dump(self, f, protocol=5, buffer_callback=buffers.append)
+        for i, buffer in enumerate(buffers):
+            np.save(f"{filepath}.buf{i}.npy", np.frombuffer(buffer.raw(), dtype=np.uint8))
         print(f"✅ Model saved to {filepath}")
     
     @classmethod
     def load_model(cls, filepath):
         """Load the model"""
+        buffers = [np.load(path, mmap_mode='r') for path in companion_buffer_paths(filepath)]
         with open(filepath, 'rb') as f:
-            return pickle.load(f)
+            return pickle.load(f, buffers=buffers)
 
 def create_improved_model():
     """Create an improved model that gives more realistic predictions"""
@@ -116,24 +190,35 @@ import pickle
 import numpy as np
 import os
 
+from ai_model.quick_model import companion_buffer_paths
+
 class ModelWrapper:
     def __init__(self, model_path):
         if os.path.exists(model_path):
+            # Large arrays are memory-mapped from the companion files
+            # rather than read into memory with the pickle
+            buffers = [np.load(path, mmap_mode='r') for path in companion_buffer_paths(model_path)]
             with open(model_path, 'rb') as f:
-                self.model = pickle.load(f)
+                self.model = pickle.load(f, buffers=buffers)
         else:
             from ai_model.quick_model import SimpleSkinLesionModel
             self.model = SimpleSkinLesionModel()
     
     def predict(self, image_array, filename="unknown.jpg"):
-        """Predict using the simple model"""
+        """
+        Predict using the simple model
+        Returns: (benign_prob, malignant_prob)
+        """
         pred, conf = self.model.predict(filename)
         
-        # Convert to format expected by the web application
         if pred == 'malignant':
-            return np.array([[1-conf, conf]])  # [benign_prob, malignant_prob]
+            return 1 - conf, conf
         else:
-            return np.array([[conf, 1-conf]])  # [benign_prob, malignant_prob]
+            return conf, 1 - conf
+    
+    def predict_proba(self, image_array, filename="unknown.jpg"):
+        """Probabilities as a (1, 2) array [[benign_prob, malignant_prob]], Keras/sklearn style"""
+        return np.array([self.predict(image_array, filename)])
 
 # Global model instance
 _model = None
@@ -147,10 +232,7 @@ def get_model():
 def predict_image(image_array, filename="unknown.jpg"):
     """Function to be called by the web application"""
     model = get_model()
-    predictions = model.predict(image_array, filename)
-    
-    benign_prob = float(predictions[0][0])
-    malignant_prob = float(predictions[0][1])
+    benign_prob, malignant_prob = model.predict(image_array, filename)
     
     if malignant_prob > benign_prob:
         return 'MALIGNANT', malignant_prob
@@ -13,10 +13,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import with error handling for both relative and absolute imports
 try:
-    from .data_loader import load_dataset
+    from .data_loader import load_dataset_splits, make_streaming_dataset, make_tfrecord_dataset, load_tfrecord_metadata, tfrecords_are_current
     from .dataset_processor import DatasetProcessor
 except ImportError:
-    from ai_model.data_loader import load_dataset
+    from ai_model.data_loader import load_dataset_splits, make_streaming_dataset, make_tfrecord_dataset, load_tfrecord_metadata, tfrecords_are_current
     from ai_model.dataset_processor import DatasetProcessor
 
 def build_efficientnet_model(input_shape=(224, 224, 3), num_classes=2, trainable_layers=20):
@@ -46,7 +46,7 @@ def build_efficientnet_model(input_shape=(224, 224, 3), num_classes=2, trainable
         layers.Dropout(0.3),
         layers.Dense(256, activation='relu'),
         layers.Dropout(0.2),
-        layers.Dense(num_classes, activation='softmax')
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     
     return model
@@ -74,7 +74,7 @@ def build_resnet_model(input_shape=(224, 224, 3), num_classes=2):
         layers.Dense(256, activation='relu'),
         layers.BatchNormalization(),
         layers.Dropout(0.3),
-        layers.Dense(num_classes, activation='softmax')
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     
     return model
@@ -119,7 +119,7 @@ def build_custom_cnn(input_shape=(224, 224, 3), num_classes=2):
         layers.Dropout(0.5),
         layers.Dense(256, activation='relu'),
         layers.Dropout(0.3),
-        layers.Dense(num_classes, activation='softmax')
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     
     return model
@@ -167,6 +167,27 @@ def train_model(model_type='efficientnet', use_processed_data=True, max_samples=
     """
     print(f"🚀 Training {model_type.upper()} model...")
     
+    # Mixed precision (float16 Tensor Core math, float32 weights) and XLA
+    # fusion only pay off on a GPU; on CPU float16 is emulated and slower.
+    # Set before any model is built; the builders keep the softmax output
+    # in float32, and compile() wraps the optimizer for loss scaling.
+    use_gpu = bool(tf.config.list_physical_devices('GPU'))
+    previous_policy = tf.keras.mixed_precision.global_policy()
+    if use_gpu:
+        tf.keras.mixed_precision.set_global_policy('mixed_float16')
+        print("⚡ GPU found: mixed precision and XLA enabled")
+    
+    try:
+        return _train_model(model_type, use_processed_data, max_samples, use_gpu)
+    finally:
+        # The policy is process-wide; restore it so models built later in
+        # this process (tests, fairness evaluators) are not float16
+        tf.keras.mixed_precision.set_global_policy(previous_policy)
+
+def _train_model(model_type, use_processed_data, max_samples, use_gpu):
+    """Body of train_model, run under the precision policy it selected"""
+    input_dtype = 'float16' if use_gpu else 'float32'
+    
     # Process datasets if needed
     if use_processed_data:
         processed_dir = Path("dataset/processed")
@@ -178,20 +199,47 @@ def train_model(model_type='efficientnet', use_processed_data=True, max_samples=
     # Load dataset
     dataset_path = "dataset/processed" if use_processed_data else "dataset/raw"
     
+    tfrecord_dir = Path(dataset_path) / "tfrecords"
+    
     try:
-        X_train, X_val, X_test, y_train, y_val, y_test, class_map, class_weights = load_dataset(
-            dataset_path, 
-            img_size=(224, 224),
-            test_size=0.15,
-            validation_size=0.15,
-            augment=True,
-            max_samples_per_class=max_samples
-        )
+        use_tfrecords = (tfrecord_dir / "tfrecords.json").exists() and max_samples is None
+        if use_tfrecords and not tfrecords_are_current(tfrecord_dir, dataset_path):
+            print("⚠️ TFRecord shards are stale (images or preprocessing changed); streaming from images instead")
+            use_tfrecords = False
+        
+        if use_tfrecords:
+            # Pre-packed shards written by DatasetProcessor.write_tfrecords
+            meta = load_tfrecord_metadata(tfrecord_dir)
+            class_map, class_weights = meta['class_map'], meta['class_weights']
+            width, height = meta['img_size']
+            input_shape = (height, width, 3)
+            num_classes = len(class_map)
+            
+            train_ds = make_tfrecord_dataset(tfrecord_dir, 'train', batch_size=32, shuffle=True, augment=True, dtype=input_dtype)
+            val_ds = make_tfrecord_dataset(tfrecord_dir, 'val', batch_size=32, dtype=input_dtype)
+            test_ds = make_tfrecord_dataset(tfrecord_dir, 'test', batch_size=32, dtype=input_dtype)
+            split_sizes = meta['counts']
+        else:
+            # Images stay in the memory-mapped uint8 cache and are streamed per batch
+            X, y, (train_idx, val_idx, test_idx), class_map, class_weights = load_dataset_splits(
+                dataset_path, 
+                img_size=(224, 224),
+                test_size=0.15,
+                validation_size=0.15,
+                max_samples_per_class=max_samples
+            )
+            input_shape = X.shape[1:]
+            num_classes = y.shape[1]
+            
+            train_ds = make_streaming_dataset(X, y, train_idx, batch_size=32, shuffle=True, augment=True, dtype=input_dtype)
+            val_ds = make_streaming_dataset(X, y, val_idx, batch_size=32, dtype=input_dtype)
+            test_ds = make_streaming_dataset(X, y, test_idx, batch_size=32, dtype=input_dtype)
+            split_sizes = {'train': len(train_idx), 'val': len(val_idx), 'test': len(test_idx)}
         
         print(f"✅ Dataset loaded successfully!")
-        print(f"   Training: {X_train.shape}")
-        print(f"   Validation: {X_val.shape}")
-        print(f"   Test: {X_test.shape}")
+        print(f"   Training: {split_sizes['train']} images")
+        print(f"   Validation: {split_sizes['val']} images")
+        print(f"   Test: {split_sizes['test']} images")
         
     except Exception as e:
         print(f"❌ Error loading dataset: {e}")
@@ -199,9 +247,6 @@ def train_model(model_type='efficientnet', use_processed_data=True, max_samples=
         return create_dummy_model()
     
     # Build model
-    input_shape = X_train.shape[1:]
-    num_classes = y_train.shape[1]
-    
     if model_type == 'efficientnet':
         model = build_efficientnet_model(input_shape, num_classes)
         learning_rate = 0.0001
@@ -216,7 +261,8 @@ def train_model(model_type='efficientnet', use_processed_data=True, max_samples=
     model.compile(
         optimizer=optimizers.Adam(learning_rate=learning_rate),
         loss='categorical_crossentropy',
-        metrics=['accuracy', 'precision', 'recall']
+        metrics=['accuracy', 'precision', 'recall'],
+        jit_compile=use_gpu
     )
     
     print(f"📊 Model Summary:")
@@ -228,10 +274,9 @@ def train_model(model_type='efficientnet', use_processed_data=True, max_samples=
     # Train model
     print(f"🎯 Starting training...")
     history = model.fit(
-        X_train, y_train,
-        validation_data=(X_val, y_val),
+        train_ds,
+        validation_data=val_ds,
         epochs=50,
-        batch_size=32,
         class_weight=class_weights,
         callbacks=model_callbacks,
         verbose=1
@@ -239,7 +284,7 @@ def train_model(model_type='efficientnet', use_processed_data=True, max_samples=
     
     # Evaluate on test set
     print(f"🧪 Evaluating on test set...")
-    test_loss, test_acc, test_precision, test_recall = model.evaluate(X_test, y_test, verbose=0)
+    test_loss, test_acc, test_precision, test_recall = model.evaluate(test_ds, verbose=0)
     test_f1 = 2 * (test_precision * test_recall) / (test_precision + test_recall) if (test_precision + test_recall) > 0 else 0
     
     print(f"\n📈 FINAL TEST RESULTS:")
@@ -3,6 +3,7 @@ import numpy as np
 import cv2
 import tempfile
 import os
+from unittest import mock
 from PIL import Image
 import tensorflow as tf
 
@@ -13,8 +14,9 @@ from ai_model.preprocess import (
     lighting_correction, 
     preprocess_image
 )
-from ai_model.train import build_custom_cnn
-from ai_model.data_loader import load_dataset
+from ai_model.train import build_custom_cnn, train_model
+from ai_model.data_loader import load_dataset, make_tf_dataset, make_streaming_dataset, make_tfrecord_dataset, tfrecords_are_current
+from ai_model.dataset_processor import DatasetProcessor
 
 
 class PreprocessingTestCase(unittest.TestCase):
@@ -127,6 +129,15 @@ class CNNModelTestCase(unittest.TestCase):
         )
         
         self.assertEqual(model.optimizer.name, 'adam')
+    
+    def test_train_model_restores_precision_policy(self):
+        """Test the GPU mixed precision policy does not outlive train_model, even on error"""
+        with mock.patch('tensorflow.config.list_physical_devices', return_value=['GPU']), \
+                mock.patch('ai_model.train._train_model', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                train_model()
+        
+        self.assertEqual(tf.keras.mixed_precision.global_policy().name, 'float32')
 
 
 class DataLoaderTestCase(unittest.TestCase):
@@ -187,6 +198,57 @@ class DataLoaderTestCase(unittest.TestCase):
         except Exception as e:
             # If preprocessing fails due to missing dependencies, skip this test
             self.skipTest(f"Dataset loading test skipped due to: {e}")
+    
+    def test_make_tf_dataset_normalizes_and_augments_minority_only(self):
+        """Test tf.data pipeline scales to [0, 1] and leaves benign images untouched"""
+        X = np.random.randint(0, 255, (6, 32, 32, 3), dtype=np.uint8)
+        y = np.array([[1, 0]] * 3 + [[0, 1]] * 3, dtype=np.float32)
+        
+        batches = list(make_tf_dataset(X, y, batch_size=4, augment=True))
+        images = np.concatenate([images.numpy() for images, _ in batches])
+        
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(images.dtype, np.float32)
+        self.assertTrue(np.all(images >= 0) and np.all(images <= 1))
+        np.testing.assert_allclose(images[:3], X[:3] / 255.0, rtol=1e-6)
+    
+    def test_make_tf_dataset_bfloat16_batches(self):
+        """Test half-width output batches stay within rounding of float32"""
+        X = np.random.randint(0, 255, (4, 32, 32, 3), dtype=np.uint8)
+        y = np.eye(2, dtype=np.float32)[[0, 1, 0, 1]]
+        
+        images, _ = next(iter(make_tf_dataset(X, y, batch_size=4, dtype='bfloat16')))
+        
+        self.assertEqual(images.dtype, tf.bfloat16)
+        np.testing.assert_allclose(tf.cast(images, tf.float32).numpy(), X / 255.0, atol=4e-3)
+    
+    def test_make_streaming_dataset_reads_selected_rows(self):
+        """Test the streaming pipeline yields only the requested rows"""
+        X = np.random.randint(0, 255, (6, 32, 32, 3), dtype=np.uint8)
+        y = np.eye(2, dtype=np.float32)[[0, 1, 0, 1, 0, 1]]
+        indices = np.array([4, 1, 2])
+        
+        batches = list(make_streaming_dataset(X, y, indices, batch_size=2))
+        images = np.concatenate([images.numpy() for images, _ in batches])
+        labels = np.concatenate([labels.numpy() for _, labels in batches])
+        
+        np.testing.assert_allclose(images, X[indices] / 255.0, rtol=1e-6)
+        np.testing.assert_array_equal(labels, y[indices])
+    
+    def test_tfrecord_shards_round_trip(self):
+        """Test images packed into TFRecord shards read back into every split"""
+        processor = DatasetProcessor(self.temp_dir, self.temp_dir)
+        out_dir = processor.write_tfrecords(img_size=(32, 32), shard_size=2, test_size=0.2, validation_size=0.2)
+        self.assertTrue(tfrecords_are_current(out_dir, self.temp_dir))
+        
+        total = 0
+        for split in ['train', 'val', 'test']:
+            for images, labels in make_tfrecord_dataset(out_dir, split, batch_size=4):
+                self.assertEqual(images.shape[1:], (32, 32, 3))
+                self.assertTrue(np.all(images.numpy() <= 1.0))
+                np.testing.assert_array_equal(labels.numpy().sum(axis=1), 1.0)
+                total += len(images)
+        self.assertEqual(total, 10)
 
 
 if __name__ == '__main__':
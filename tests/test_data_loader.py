@@ -0,0 +1,136 @@
+import unittest
+import numpy as np
+import tempfile
+import shutil
+import os
+from PIL import Image
+
+from ai_model.data_loader import (
+    load_dataset, load_dataset_splits, _one_hot, _balanced_class_weights,
+    dataset_fingerprint, tfrecords_are_current, PREPROCESS_VERSION, JPEG_DECODER
+)
+from ai_model.json_io import write_json
+
+
+class LoadDatasetTestCase(unittest.TestCase):
+    """Tests for loading the processed dataset into train/val/test splits"""
+    
+    def setUp(self):
+        """Create temporary dataset structure for testing"""
+        self.temp_dir = tempfile.mkdtemp()
+        
+        for cls, count in [('benign', 8), ('malignant', 6)]:
+            class_dir = os.path.join(self.temp_dir, cls)
+            os.makedirs(class_dir)
+            for i in range(count):
+                test_image = np.random.randint(0, 255, (80, 100, 3), dtype=np.uint8)
+                Image.fromarray(test_image).save(os.path.join(class_dir, f'{cls}_{i}.jpg'))
+        
+        # Unreadable file should be skipped, not abort the load
+        open(os.path.join(self.temp_dir, 'benign', 'broken.jpg'), 'w').close()
+    
+    def tearDown(self):
+        """Clean up temporary dataset"""
+        shutil.rmtree(self.temp_dir)
+    
+    def load(self, **kwargs):
+        kwargs.setdefault('num_workers', 1)
+        return load_dataset(self.temp_dir, img_size=(32, 32), **kwargs)
+    
+    def test_load_dataset_structure(self):
+        """Test dataset loading returns correct structure"""
+        X_train, X_val, X_test, y_train, y_val, y_test, class_map, class_weights = self.load()
+        
+        self.assertEqual(len(X_train) + len(X_val) + len(X_test), 14)
+        self.assertEqual(X_train.shape[1:], (32, 32, 3))
+        self.assertEqual(X_train.dtype, np.float32)
+        self.assertTrue(np.all(X_train <= 1.0))
+        
+        self.assertEqual(class_map, {'benign': 0, 'malignant': 1})
+        self.assertEqual(y_train.shape[1], len(class_map))
+        np.testing.assert_array_equal(y_train.sum(axis=1), 1.0)
+        self.assertEqual(set(class_weights), {0, 1})
+    
+    def test_cache_reused_on_second_load(self):
+        """Test decoded images are cached and give identical results"""
+        first = self.load()
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'cache_32x32.npy')))
+        
+        second = self.load()
+        for a, b in zip(first[:6], second[:6]):
+            np.testing.assert_array_equal(a, b)
+    
+    def test_uint8_output(self):
+        """Test normalize=False keeps images as uint8"""
+        X_train = self.load(normalize=False)[0]
+        self.assertEqual(X_train.dtype, np.uint8)
+    
+    def test_splits_index_memmapped_cache(self):
+        """Test load_dataset_splits keeps images on disk and splits by index"""
+        X, y, splits, class_map, _ = load_dataset_splits(self.temp_dir, img_size=(32, 32), num_workers=1)
+        
+        self.assertIsInstance(X, np.memmap)
+        self.assertEqual(X.dtype, np.uint8)
+        self.assertEqual(y.shape, (14, 2))
+        
+        all_idx = np.concatenate(splits)
+        self.assertEqual(sorted(all_idx), list(range(14)))
+    
+    def test_return_paths_match_rows(self):
+        """Test return_paths gives the source image of every row"""
+        X, y, _, class_map, _, paths = load_dataset_splits(
+            self.temp_dir, img_size=(32, 32), num_workers=1, return_paths=True
+        )
+        
+        self.assertEqual(len(paths), len(X))
+        for label, path in zip(y.argmax(axis=1), paths):
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(class_map[os.path.basename(os.path.dirname(path))], label)
+    
+    def test_tfrecord_manifest_staleness(self):
+        """Test shards count as stale after an image, version or decoder change"""
+        tfrecord_dir = os.path.join(self.temp_dir, 'tfrecords')
+        os.makedirs(tfrecord_dir)
+        manifest = {
+            'img_size': [32, 32], 'class_map': {'benign': 0, 'malignant': 1},
+            'class_weights': {'0': 1.0, '1': 1.0}, 'counts': {},
+            'preprocess_version': PREPROCESS_VERSION, 'jpeg_decoder': JPEG_DECODER,
+            'fingerprint': dataset_fingerprint(self.temp_dir, (32, 32))
+        }
+        manifest_path = os.path.join(tfrecord_dir, 'tfrecords.json')
+        write_json(manifest_path, manifest)
+        self.assertTrue(tfrecords_are_current(tfrecord_dir, self.temp_dir))
+        
+        for key, value in [('preprocess_version', PREPROCESS_VERSION - 1), ('jpeg_decoder', 'other')]:
+            write_json(manifest_path, dict(manifest, **{key: value}))
+            self.assertFalse(tfrecords_are_current(tfrecord_dir, self.temp_dir))
+        
+        write_json(manifest_path, manifest)
+        Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(os.path.join(self.temp_dir, 'benign', 'new.jpg'))
+        self.assertFalse(tfrecords_are_current(tfrecord_dir, self.temp_dir))
+    
+    def test_parallel_matches_serial(self):
+        """Test multi-process decoding gives the same pixels as serial decoding"""
+        serial = self.load(use_cache=False)
+        parallel = self.load(use_cache=False, num_workers=2)
+        np.testing.assert_array_equal(serial[0], parallel[0])
+
+
+class LabelEncodingTestCase(unittest.TestCase):
+    """Tests for one-hot labels and class weights"""
+    
+    def test_one_hot(self):
+        """Test one-hot encoding of integer labels"""
+        one_hot = _one_hot(np.array([0, 1, 1]), 2)
+        np.testing.assert_array_equal(one_hot, [[1, 0], [0, 1], [0, 1]])
+        self.assertEqual(one_hot.dtype, np.float32)
+    
+    def test_balanced_class_weights(self):
+        """Test weights are n_samples / (n_classes * count)"""
+        weights = _balanced_class_weights(np.array([0, 0, 0, 1]))
+        self.assertAlmostEqual(weights[0], 4 / (2 * 3))
+        self.assertAlmostEqual(weights[1], 4 / (2 * 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import unittest
+import numpy as np
+import pandas as pd
+import tempfile
+import shutil
+import os
+import json
+from pathlib import Path
+from unittest import mock
+from PIL import Image
+
+from ai_model import dataset_processor
+from ai_model.dataset_processor import DatasetProcessor
+
+
+class DatasetProcessorTestCase(unittest.TestCase):
+    """Tests for building the processed benign/malignant tree"""
+    
+    def setUp(self):
+        """Create a minimal raw HAM10000 layout"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.raw_dir = self.temp_dir / 'raw'
+        self.processed_dir = self.temp_dir / 'processed'
+        
+        ham_dir = self.raw_dir / 'HAM10000'
+        (ham_dir / 'HAM10000_images_part_1').mkdir(parents=True)
+        (ham_dir / 'HAM10000_images_part_2').mkdir(parents=True)
+        
+        rows = [('ISIC_0000001', 'mel'), ('ISIC_0000002', 'nv'), ('ISIC_0000003', 'bkl')]
+        for i, (image_id, _) in enumerate(rows[:2]):
+            image = np.random.randint(0, 255, (50, 50, 3), dtype=np.uint8)
+            part = 'HAM10000_images_part_1' if i == 0 else 'HAM10000_images_part_2'
+            Image.fromarray(image).save(ham_dir / part / f'{image_id}.jpg')
+        
+        pd.DataFrame(rows, columns=['image_id', 'dx']).to_csv(
+            ham_dir / 'HAM10000_metadata.csv', index=False
+        )
+    
+    def tearDown(self):
+        """Clean up temporary dataset"""
+        shutil.rmtree(self.temp_dir)
+    
+    def make_processor(self, copy_mode):
+        processor = DatasetProcessor(self.raw_dir, self.processed_dir, copy_mode=copy_mode)
+        for cls in ['benign', 'malignant']:
+            (self.processed_dir / cls).mkdir(parents=True, exist_ok=True)
+        return processor
+    
+    def test_ham10000_images_sorted_by_class(self):
+        """Test HAM10000 images land in the right class folder"""
+        stats = self.make_processor('copy').process_ham10000_dataset()
+        
+        self.assertTrue((self.processed_dir / 'malignant' / 'HAM_mel_ISIC_0000001.jpg').exists())
+        self.assertTrue((self.processed_dir / 'benign' / 'HAM_nv_ISIC_0000002.jpg').exists())
+        self.assertEqual(stats['total_ham'], 2)
+        self.assertEqual(stats['ham_missing'], 1)
+    
+    def test_rerun_skips_existing_files(self):
+        """Test a second run does not process files again"""
+        processor = self.make_processor('copy')
+        processor.process_ham10000_dataset()
+        stats = processor.process_ham10000_dataset()
+        
+        self.assertEqual(stats['total_ham'], 0)
+    
+    def test_hardlink_mode_shares_source_file(self):
+        """Test hardlink mode does not duplicate image bytes"""
+        self.make_processor('hardlink').process_ham10000_dataset()
+        
+        src = self.raw_dir / 'HAM10000' / 'HAM10000_images_part_1' / 'ISIC_0000001.jpg'
+        dst = self.processed_dir / 'malignant' / 'HAM_mel_ISIC_0000001.jpg'
+        self.assertTrue(os.path.samefile(src, dst))
+    
+    def test_fitzpatrick_images_matched_by_md5(self):
+        """Test Fitzpatrick17k rows are matched to images by md5 hash"""
+        fitz_dir = self.raw_dir / 'Fitzpatrick17k'
+        img_dir = fitz_dir / 'background removed'
+        img_dir.mkdir(parents=True)
+        
+        rows = [
+            ('a' * 32, 'melanoma', 'malignant melanoma'),
+            ('b' * 32, 'acne vulgaris', 'non-neoplastic'),
+            ('c' * 32, 'psoriasis', 'non-neoplastic'),
+        ]
+        for md5hash, _, _ in rows[:2]:
+            image = np.random.randint(0, 255, (50, 50, 3), dtype=np.uint8)
+            Image.fromarray(image).save(img_dir / f'{md5hash}.jpg')
+        pd.DataFrame(rows, columns=['md5hash', 'label', 'three_partition_label']).to_csv(
+            fitz_dir / 'fitzpatrick17k (1).csv', index=False
+        )
+        
+        stats = self.make_processor('copy').process_fitzpatrick_dataset()
+        
+        self.assertTrue((self.processed_dir / 'malignant' / f"FITZ_melanoma_{'a' * 32}.jpg").exists())
+        self.assertTrue((self.processed_dir / 'benign' / f"FITZ_acne_vulgaris_{'b' * 32}.jpg").exists())
+        self.assertEqual(stats['total_fitz'], 2)
+        self.assertEqual(stats['fitz_missing'], 1)
+    
+    def test_fitzpatrick_bad_row_skipped(self):
+        """Test a row with a missing label is skipped without losing the other rows"""
+        fitz_dir = self.raw_dir / 'Fitzpatrick17k'
+        img_dir = fitz_dir / 'background removed'
+        img_dir.mkdir(parents=True)
+        
+        rows = [('a' * 32, None, 'malignant melanoma'), ('b' * 32, 'melanoma', 'malignant melanoma')]
+        for md5hash, _, _ in rows:
+            image = np.random.randint(0, 255, (50, 50, 3), dtype=np.uint8)
+            Image.fromarray(image).save(img_dir / f'{md5hash}.jpg')
+        pd.DataFrame(rows, columns=['md5hash', 'label', 'three_partition_label']).to_csv(
+            fitz_dir / 'fitzpatrick17k (1).csv', index=False
+        )
+        
+        stats = self.make_processor('copy').process_fitzpatrick_dataset()
+        
+        self.assertTrue((self.processed_dir / 'malignant' / f"FITZ_melanoma_{'b' * 32}.jpg").exists())
+        self.assertEqual(stats['total_fitz'], 1)
+    
+    def test_duplicate_content_copied_once(self):
+        """Test byte-identical images under different names are only placed once"""
+        ham_dir = self.raw_dir / 'HAM10000'
+        shutil.copy(ham_dir / 'HAM10000_images_part_1' / 'ISIC_0000001.jpg',
+                    ham_dir / 'HAM10000_images_part_1' / 'ISIC_0000004.jpg')
+        rows = [('ISIC_0000001', 'mel'), ('ISIC_0000002', 'nv'), ('ISIC_0000004', 'mel')]
+        pd.DataFrame(rows, columns=['image_id', 'dx']).to_csv(ham_dir / 'HAM10000_metadata.csv', index=False)
+        
+        stats = self.make_processor('copy').process_ham10000_dataset()
+        
+        self.assertEqual(stats['total_ham'], 2)
+        self.assertEqual(stats['ham_duplicates'], 1)
+        self.assertFalse((self.processed_dir / 'malignant' / 'HAM_mel_ISIC_0000004.jpg').exists())
+        
+        # Hashes persist, so a fresh processor still recognises the duplicate
+        (ham_dir / 'HAM10000_images_part_1' / 'ISIC_0000004.jpg').rename(
+            ham_dir / 'HAM10000_images_part_2' / 'ISIC_0000004.jpg')
+        stats = self.make_processor('copy').process_ham10000_dataset()
+        self.assertEqual(stats['total_ham'], 0)
+        self.assertEqual(stats['ham_duplicates'], 1)
+    
+    def add_duplicate_row(self):
+        """Make ISIC_0000004 a byte-identical copy of ISIC_0000001 and list it after it"""
+        ham_dir = self.raw_dir / 'HAM10000'
+        shutil.copy(ham_dir / 'HAM10000_images_part_1' / 'ISIC_0000001.jpg',
+                    ham_dir / 'HAM10000_images_part_1' / 'ISIC_0000004.jpg')
+        rows = [('ISIC_0000001', 'mel'), ('ISIC_0000002', 'nv'), ('ISIC_0000004', 'mel')]
+        pd.DataFrame(rows, columns=['image_id', 'dx']).to_csv(ham_dir / 'HAM10000_metadata.csv', index=False)
+    
+    def test_deleted_target_is_placed_again(self):
+        """Test a hash whose processed file was deleted no longer counts as a duplicate"""
+        self.add_duplicate_row()
+        self.make_processor('copy').process_ham10000_dataset()
+        (self.processed_dir / 'malignant' / 'HAM_mel_ISIC_0000001.jpg').unlink()
+        
+        stats = self.make_processor('copy').process_ham10000_dataset()
+        self.assertEqual(stats['total_ham'], 1)
+        self.assertEqual(stats['ham_duplicates'], 1)
+        self.assertTrue((self.processed_dir / 'malignant' / 'HAM_mel_ISIC_0000001.jpg').exists())
+        
+        with open(self.processed_dir / 'seen.json') as f:
+            targets = set(json.load(f)['hashes'].values())
+        self.assertEqual(targets, {'malignant/HAM_mel_ISIC_0000001.jpg', 'benign/HAM_nv_ISIC_0000002.jpg'})
+    
+    def test_failed_copy_falls_back_to_duplicate(self):
+        """Test a failed copy is not recorded and the same content is placed from its duplicate"""
+        self.add_duplicate_row()
+        link_or_copy = dataset_processor._link_or_copy
+        
+        def failing_copy(src, dst, mode):
+            if str(dst).endswith('HAM_mel_ISIC_0000001.jpg'):
+                raise OSError('disk full')
+            link_or_copy(src, dst, mode)
+        
+        with mock.patch('ai_model.dataset_processor._link_or_copy', side_effect=failing_copy):
+            stats = self.make_processor('copy').process_ham10000_dataset()
+        
+        self.assertEqual(stats['total_ham'], 2)
+        self.assertEqual(stats['ham_duplicates'], 0)
+        self.assertTrue((self.processed_dir / 'malignant' / 'HAM_mel_ISIC_0000004.jpg').exists())
+        self.assertFalse((self.processed_dir / 'malignant' / 'HAM_mel_ISIC_0000001.jpg').exists())
+    
+    def test_processing_stats_count_existing_files(self):
+        """Test final counts include images kept from an earlier run"""
+        processor = self.make_processor('copy')
+        processor.process_ham10000_dataset()
+        processor.save_processing_stats(processor.process_ham10000_dataset())
+        
+        with open(self.processed_dir / 'processing_stats.json') as f:
+            final_counts = json.load(f)['final_counts']
+        self.assertEqual(final_counts, {'benign': 1, 'malignant': 1, 'total': 2})
+    
+    def test_invalid_copy_mode(self):
+        """Test unknown copy modes are rejected"""
+        with self.assertRaises(ValueError):
+            DatasetProcessor(self.raw_dir, self.processed_dir, copy_mode='move')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import numpy as np
+import cv2
+import tempfile
+import shutil
+import os
+
+from ai_model.fairness_audit import SkinToneClassifier, FairnessEvaluator
+
+
+class SkinToneClassifierTestCase(unittest.TestCase):
+    """Tests for brightness-based skin tone classification"""
+    
+    def setUp(self):
+        """Create solid-colour test images (BGR)"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for name, bgr in [('light', (200, 220, 250)), ('dark', (40, 60, 90)), ('blue', (255, 0, 0))]:
+            path = os.path.join(self.temp_dir, f'{name}.png')
+            cv2.imwrite(path, np.full((64, 64, 3), bgr, dtype=np.uint8))
+            self.paths.append(path)
+        self.paths.append(os.path.join(self.temp_dir, 'missing.png'))
+    
+    def tearDown(self):
+        """Clean up temporary images"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_batch_labels(self):
+        """Test brightness buckets, and 'unknown' for no skin pixels or unreadable files"""
+        labels = SkinToneClassifier.classify_skin_tones_batch(self.paths)
+        self.assertEqual(list(labels), ['light', 'dark', 'unknown', 'unknown'])
+    
+    def test_parallel_matches_serial(self):
+        """Test thread-pool classification keeps path order"""
+        serial = SkinToneClassifier.classify_skin_tones_batch(self.paths, num_workers=1)
+        parallel = SkinToneClassifier.classify_skin_tones_batch(self.paths, num_workers=4)
+        self.assertEqual(list(serial), list(parallel))
+    
+    def test_single_image(self):
+        """Test the single-image entry point"""
+        self.assertEqual(SkinToneClassifier.classify_skin_tone_simple(self.paths[0]), 'light')
+    
+    def test_cache_keeps_other_images(self):
+        """Test classifying a subset does not drop cached labels for other images"""
+        evaluator = FairnessEvaluator.__new__(FairnessEvaluator)
+        evaluator.skin_classifier = SkinToneClassifier()
+        evaluator.skin_tone_cache = os.path.join(self.temp_dir, 'skin_tones.csv')
+        
+        self.assertEqual(evaluator._classify_skin_tones(self.paths[:2]), ['light', 'dark'])
+        self.assertEqual(evaluator._classify_skin_tones(self.paths[2:3]), ['unknown'])
+        
+        cache = evaluator._read_skin_tone_cache()
+        self.assertEqual(sorted(cache['path']), sorted(self.paths[:3]))
+        self.assertEqual(evaluator._classify_skin_tones(self.paths[:1]), ['light'])
+
+
+class FairnessMetricsTestCase(unittest.TestCase):
+    """Tests for the group fairness helpers (no model needed)"""
+    
+    def setUp(self):
+        # Bypass __init__, which loads a Keras model
+        self.evaluator = FairnessEvaluator.__new__(FairnessEvaluator)
+        self.groups = ['light', 'dark', 'light', 'unknown', 'dark', 'light']
+        self.y_true = np.array([1, 1, 0, 1, 0, 0])
+        self.y_pred = np.array([1, 0, 1, 1, 0, 0])
+    
+    def test_group_indices_drop_unknown(self):
+        """Test rows are grouped once and 'unknown' is left out"""
+        group_index = FairnessEvaluator._group_indices(self.groups)
+        
+        self.assertEqual(set(group_index), {'light', 'dark'})
+        np.testing.assert_array_equal(group_index['light'], [0, 2, 5])
+        np.testing.assert_array_equal(group_index['dark'], [1, 4])
+    
+    def test_fairness_metrics(self):
+        """Test parity, equal opportunity and equalized odds differences"""
+        group_index = FairnessEvaluator._group_indices(self.groups)
+        metrics = self.evaluator._calculate_fairness_metrics(self.y_true, self.y_pred, group_index)
+        
+        # light: positive rate 2/3, TPR 1, FPR 1/2; dark: positive rate 0, TPR 0, FPR 0
+        self.assertAlmostEqual(metrics['demographic_parity_difference'], 2 / 3)
+        self.assertAlmostEqual(metrics['equal_opportunity_difference'], 1.0)
+        self.assertAlmostEqual(metrics['equalized_odds_difference'], 1.0)
+    
+    def test_single_group_needs_two(self):
+        """Test fairness metrics report an error with fewer than two groups"""
+        group_index = FairnessEvaluator._group_indices(['light'] * 3)
+        metrics = self.evaluator._calculate_fairness_metrics(self.y_true[:3], self.y_pred[:3], group_index)
+        self.assertIn('error', metrics)
+    
+    def test_bias_patterns(self):
+        """Test per-group confidence statistics and error rates"""
+        group_index = FairnessEvaluator._group_indices(self.groups)
+        max_proba = np.array([0.9, 0.6, 0.7, 0.8, 0.5, 0.8])
+        bias = self.evaluator._analyze_bias_patterns(self.y_true, self.y_pred, group_index, max_proba)
+        
+        light = bias['confidence_by_group']['light']
+        self.assertAlmostEqual(light['mean_confidence'], 0.8)
+        self.assertAlmostEqual(light['std_confidence'], np.std([0.9, 0.7, 0.8]))
+        self.assertAlmostEqual(light['min_confidence'], 0.7)
+        self.assertAlmostEqual(bias['error_rates_by_group']['light'], 1 / 3)
+        self.assertAlmostEqual(bias['error_rates_by_group']['dark'], 1 / 2)
+    
+    def test_results_table(self):
+        """Test results flatten into one (group, metric, value) row per number"""
+        group_index = FairnessEvaluator._group_indices(self.groups)
+        results = {
+            'overall_metrics': self.evaluator._calculate_overall_metrics(self.y_true, self.y_pred),
+            'group_metrics': self.evaluator._calculate_group_metrics(self.y_true, self.y_pred, group_index),
+            'fairness_metrics': self.evaluator._calculate_fairness_metrics(self.y_true, self.y_pred, group_index),
+            'bias_analysis': self.evaluator._analyze_bias_patterns(
+                self.y_true, self.y_pred, group_index, np.full(6, 0.75)
+            )
+        }
+        table = FairnessEvaluator.results_table(results)
+        
+        self.assertEqual(list(table.columns), ['group', 'metric', 'value'])
+        self.assertFalse(table.duplicated(['group', 'metric']).any())
+        values = table.set_index(['group', 'metric'])['value']
+        self.assertEqual(values[('overall', 'confusion_1_0')], 1)
+        self.assertEqual(values[('dark', 'sample_size')], 2)
+        self.assertAlmostEqual(values[('all', 'demographic_parity_difference')], 2 / 3)
+        self.assertAlmostEqual(values[('light', 'error_rate')], 1 / 3)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = self.evaluator.save_results_table(results, os.path.join(temp_dir, 'results.parquet'))
+            self.assertTrue(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import unittest
+import numpy as np
+import cv2
+import pandas as pd
+import tempfile
+import shutil
+import os
+import matplotlib.pyplot as plt
+
+from ai_model.fairness_evaluation import FairnessEvaluator, SkinToneDetector
+
+
+class SkinToneDetectorTestCase(unittest.TestCase):
+    """Tests for HSV-range skin tone detection"""
+    
+    def setUp(self):
+        """Write test images built from HSV pixels"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.detector = SkinToneDetector()
+    
+    def tearDown(self):
+        """Clean up temporary images"""
+        shutil.rmtree(self.temp_dir)
+    
+    def write_hsv(self, name, hsv):
+        path = os.path.join(self.temp_dir, name)
+        cv2.imwrite(path, cv2.cvtColor(np.asarray(hsv, dtype=np.uint8), cv2.COLOR_HSV2BGR))
+        return path
+    
+    def test_tone_with_most_pixels(self):
+        """Test overlapping ranges each count a pixel, and the largest count wins"""
+        # (30, 100, 200) is only 'light'; (10, 100, 200) is 'very_light' and 'medium'
+        hsv = np.zeros((8, 8, 3), dtype=np.uint8)
+        hsv[:6] = (30, 100, 200)
+        hsv[6:] = (10, 100, 200)
+        self.assertEqual(self.detector.detect_skin_tone(self.write_hsv('mixed.png', hsv)), 'light')
+        
+        hsv[:2] = (30, 100, 200)
+        hsv[2:] = (10, 100, 200)
+        self.assertEqual(self.detector.detect_skin_tone(self.write_hsv('ties.png', hsv)), 'very_light')
+    
+    def test_unknown(self):
+        """Test no skin pixels or an unreadable file give 'unknown'"""
+        blue = self.write_hsv('blue.png', np.full((8, 8, 3), (120, 255, 255)))
+        self.assertEqual(self.detector.detect_skin_tone(blue), 'unknown')
+        self.assertEqual(self.detector.detect_skin_tone(os.path.join(self.temp_dir, 'missing.png')), 'unknown')
+    
+    def test_batch_matches_serial(self):
+        """Test thread-pool detection keeps path order"""
+        paths = [
+            self.write_hsv('light.png', np.full((8, 8, 3), (30, 100, 200))),
+            self.write_hsv('blue.png', np.full((8, 8, 3), (120, 255, 255))),
+            self.write_hsv('very_light.png', np.full((8, 8, 3), (10, 100, 200)))
+        ]
+        serial = self.detector.detect_skin_tones_batch(paths, num_workers=1)
+        parallel = self.detector.detect_skin_tones_batch(paths, num_workers=3)
+        self.assertEqual(serial, ['light', 'unknown', 'very_light'])
+        self.assertEqual(parallel, serial)
+    
+    def test_analyze_image_matches_separate_calls(self):
+        """Test the single-read analysis gives the same tone and brightness"""
+        hsv = np.zeros((8, 8, 3), dtype=np.uint8)
+        hsv[:] = (30, 100, 200)
+        path = self.write_hsv('light.png', hsv)
+        
+        tone, brightness = self.detector.analyze_image(path)
+        self.assertEqual(tone, self.detector.detect_skin_tone(path))
+        self.assertAlmostEqual(brightness, self.detector.analyze_brightness(path), delta=1 / 255)
+        self.assertEqual(self.detector.analyze_image(os.path.join(self.temp_dir, 'missing.png')), ('unknown', 0.5))
+
+
+class SyntheticDemographicsTestCase(unittest.TestCase):
+    """Tests for the synthetic demographic dataset"""
+    
+    def setUp(self):
+        """Keep evaluation results out of the working tree"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        self.evaluator = FairnessEvaluator()
+    
+    def tearDown(self):
+        """Clean up results directory"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def test_seeded_data_is_reproducible(self):
+        """Test the same seed gives the same dataset"""
+        first = self.evaluator.create_synthetic_demographics(200)
+        second = self.evaluator.create_synthetic_demographics(200)
+        self.assertTrue(first.equals(second))
+        for column in ['skin_tone', 'age_group', 'gender', 'image_quality']:
+            self.assertIsInstance(first[column].dtype, pd.CategoricalDtype)
+    
+    def test_simulated_accuracy_drops_for_darker_skin(self):
+        """Test simulated predictions are less accurate on darker skin tones"""
+        df = self.evaluator.create_synthetic_demographics(5000)
+        self.assertEqual(len(df), 5000)
+        self.assertTrue(set(np.unique(df['predicted_label'])) <= {0, 1})
+        
+        accuracy = (df['true_label'] == df['predicted_label']).groupby(df['skin_tone'], observed=True).mean()
+        self.assertGreater(accuracy['very_light'], accuracy['very_dark'])
+    
+    def test_visualizations_reuse_figure(self):
+        """Test repeated plots redraw one figure without piling up colorbars"""
+        df = self.evaluator.create_synthetic_demographics(200)
+        report = self.evaluator.generate_bias_report(df)
+        
+        first = self.evaluator.create_visualizations(df, report)
+        fig = self.evaluator._fig
+        second = self.evaluator.create_visualizations(df, report)
+        
+        self.assertTrue(os.path.exists(first) and os.path.exists(second))
+        self.assertIs(self.evaluator._fig, fig)
+        self.assertEqual(len(fig.axes), 5)  # four panels plus the heatmap colorbar
+    
+    def test_visualizations_leave_pyplot_alone(self):
+        """Test plotting neither registers figures with pyplot nor changes global style"""
+        df = self.evaluator.create_synthetic_demographics(200)
+        report = self.evaluator.generate_bias_report(df)
+        figures = plt.get_fignums()
+        
+        self.evaluator.create_visualizations(df, report)
+        
+        self.assertEqual(plt.get_fignums(), figures)
+        self.assertEqual(plt.rcParams['axes.facecolor'], plt.rcParamsDefault['axes.facecolor'])
+
+
+class GroupMetricsTestCase(unittest.TestCase):
+    """Tests for per-group performance metrics"""
+    
+    def setUp(self):
+        """Small frame with hand-countable confusion matrices"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        self.evaluator = FairnessEvaluator()
+        self.df = pd.DataFrame({
+            'skin_tone': ['light', 'dark', 'light', 'dark', 'light', 'dark'],
+            'true_label': [1, 0, 0, 0, 1, 1],
+            'predicted_label': [1, 1, 0, 0, 0, 1]
+        })
+    
+    def tearDown(self):
+        """Clean up results directory"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def test_group_metrics(self):
+        """Test metrics per group in first-seen order"""
+        metrics = self.evaluator.compute_group_metrics(self.df, 'skin_tone')
+        self.assertEqual(list(metrics), ['light', 'dark'])
+        
+        # light: TP 1, FN 1, TN 1; dark: TP 1, FP 1, TN 1
+        light, dark = metrics['light'], metrics['dark']
+        self.assertEqual(light['sample_size'], 3)
+        self.assertAlmostEqual(light['accuracy'], 2 / 3)
+        self.assertAlmostEqual(light['precision'], 1.0)
+        self.assertAlmostEqual(light['recall'], 0.5)
+        self.assertAlmostEqual(light['f1_score'], 2 / 3)
+        self.assertAlmostEqual(light['false_positive_rate'], 0.0)
+        self.assertAlmostEqual(dark['precision'], 0.5)
+        self.assertAlmostEqual(dark['positive_rate'], 2 / 3)
+        self.assertAlmostEqual(dark['false_positive_rate'], 0.5)
+    
+    
+    def test_fairness_metrics(self):
+        """Test AIF360-style metrics, unprivileged (dark) minus privileged (light)"""
+        df = pd.DataFrame({
+            'skin_tone': ['light', 'light', 'dark', 'dark', 'medium', 'very_dark'],
+            'true_label': [1, 0, 1, 0, 1, 0],
+            'predicted_label': [1, 1, 0, 1, 0, 1]
+        })
+        metrics = self.evaluator.compute_fairness_metrics(df, 'skin_tone')
+        
+        # light: base rate 1/2, selection 1, TPR 1, FPR 1
+        # dark + very_dark: base rate 1/3, selection 2/3, TPR 0, FPR 1; medium ignored
+        self.assertAlmostEqual(metrics['statistical_parity_difference'], 1 / 3 - 1 / 2)
+        self.assertAlmostEqual(metrics['disparate_impact'], 2 / 3)
+        self.assertAlmostEqual(metrics['equalized_odds_difference'], 1.0)
+        self.assertAlmostEqual(metrics['demographic_parity_difference'], -1 / 3)
+        self.assertAlmostEqual(metrics['average_odds_difference'], -0.5)
+    
+    def test_fairness_metrics_unknown_attribute(self):
+        """Test attributes without privileged groups give no metrics"""
+        self.assertEqual(self.evaluator.compute_fairness_metrics(self.df, 'image_quality'), {})
+
+if __name__ == '__main__':
+    unittest.main()
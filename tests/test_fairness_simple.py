@@ -0,0 +1,205 @@
+import unittest
+import numpy as np
+import cv2
+import tempfile
+import shutil
+import os
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from ai_model.fairness_simple import SimpleFairnessEvaluator
+
+
+class SkinToneTestCase(unittest.TestCase):
+    """Tests for brightness-bucket skin tone detection"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        self.evaluator = SimpleFairnessEvaluator()
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def test_brightness_buckets(self):
+        """Test each bucket includes its lower edge, and white or unreadable is 'unknown'"""
+        expected = {0: 'very_dark', 39: 'dark', 77: 'medium', 128: 'light', 179: 'very_light', 255: 'unknown'}
+        for value, tone in expected.items():
+            path = os.path.join(self.temp_dir, f'gray_{value}.png')
+            cv2.imwrite(path, np.full((32, 32), value, dtype=np.uint8))
+            self.assertEqual(self.evaluator.detect_skin_tone_simple(path), tone)
+        
+        self.assertEqual(self.evaluator.detect_skin_tone_simple(os.path.join(self.temp_dir, 'missing.png')), 'unknown')
+
+
+class SyntheticDatasetTestCase(unittest.TestCase):
+    """Tests for the synthetic bias dataset"""
+    
+    def setUp(self):
+        """Keep evaluation results out of the working tree"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        self.evaluator = SimpleFairnessEvaluator()
+    
+    def tearDown(self):
+        """Clean up results directory"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def test_seeded_data_is_reproducible(self):
+        """Test the same seed gives the same dataset"""
+        first = self.evaluator.create_synthetic_dataset(200)
+        second = self.evaluator.create_synthetic_dataset(200)
+        self.assertTrue(first.equals(second))
+        for column in ['skin_tone', 'age_group', 'gender', 'image_quality']:
+            self.assertIsInstance(first[column].dtype, pd.CategoricalDtype)
+        self.assertEqual(first['true_label'].dtype, np.dtype(int))
+        self.assertEqual(first['predicted_label'].dtype, np.dtype(int))
+    
+    def test_simulated_bias(self):
+        """Test darker skin gets lower accuracy, and confidences stay in range"""
+        df = self.evaluator.create_synthetic_dataset(5000)
+        self.assertEqual(len(df), 5000)
+        self.assertTrue(set(np.unique(df['predicted_label'])) <= {0, 1})
+        self.assertTrue(df['confidence'].between(0.5, 0.99).all())
+        
+        accuracy = (df['true_label'] == df['predicted_label']).groupby(df['skin_tone']).mean()
+        self.assertGreater(accuracy['very_light'], accuracy['very_dark'])
+    
+    def test_run_without_plots(self):
+        """Test make_plots=False writes the report but no figure"""
+        results, report_path = self.evaluator.run_complete_evaluation(
+            self.evaluator.create_synthetic_dataset(300), make_plots=False
+        )
+        self.assertTrue(os.path.exists(report_path))
+        self.assertEqual(set(results['group_analysis']), {'skin_tone', 'age_group', 'gender'})
+        self.assertFalse([f for f in os.listdir(self.evaluator.results_dir) if f.endswith('.png')])
+    
+    def test_results_dir_recreated(self):
+        """Test a results directory removed after a run is created again"""
+        df = self.evaluator.create_synthetic_dataset(300)
+        self.evaluator.run_complete_evaluation(df, make_plots=False)
+        shutil.rmtree(self.evaluator.results_dir)
+        
+        _, report_path = SimpleFairnessEvaluator().run_complete_evaluation(df, make_plots=False)
+        self.assertTrue(os.path.exists(report_path))
+    
+    def test_plot_and_report_share_timestamp(self):
+        """Test one run names the report and the plot with the same timestamp"""
+        _, report_path = self.evaluator.run_complete_evaluation(self.evaluator.create_synthetic_dataset(300))
+        timestamp = os.path.basename(report_path)[len('fairness_report_'):-len('.json')]
+        plot_path = os.path.join(self.evaluator.results_dir, f'comprehensive_fairness_analysis_{timestamp}.png')
+        self.assertTrue(os.path.exists(plot_path))
+    
+    def test_visualizations_reuse_figure(self):
+        """Test repeated plots redraw one 3x3 figure"""
+        df = self.evaluator.create_synthetic_dataset(300)
+        results, _ = self.evaluator.run_complete_evaluation(df, make_plots=False)
+        
+        first = self.evaluator.create_comprehensive_visualizations(df, results)
+        fig = self.evaluator._fig
+        second = self.evaluator.create_comprehensive_visualizations(df, results)
+        
+        self.assertTrue(os.path.exists(first) and os.path.exists(second))
+        self.assertIs(self.evaluator._fig, fig)
+        self.assertEqual(len(fig.axes), 9)
+    
+    def test_visualizations_not_tracked_by_pyplot(self):
+        """Test the cached figure is not registered with pyplot"""
+        df = self.evaluator.create_synthetic_dataset(300)
+        results, _ = self.evaluator.run_complete_evaluation(df, make_plots=False)
+        figures = plt.get_fignums()
+        
+        self.evaluator.create_comprehensive_visualizations(df, results)
+        self.assertEqual(plt.get_fignums(), figures)
+
+
+class GroupMetricsTestCase(unittest.TestCase):
+    """Tests for per-group metrics from confusion counts"""
+    
+    def setUp(self):
+        """Small frame with hand-countable confusion matrices"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        self.evaluator = SimpleFairnessEvaluator()
+        self.df = pd.DataFrame({
+            'skin_tone': ['light', 'dark', 'light', 'dark', 'light', 'dark'],
+            'true_label': [1, 0, 0, 0, 1, 1],
+            'predicted_label': [1, 1, 0, 0, 0, 1],
+            'confidence': [0.9, 0.6, 0.8, 0.7, 0.5, 0.8]
+        })
+    
+    def tearDown(self):
+        """Clean up results directory"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+    
+    def test_group_metrics(self):
+        """Test metrics per group in first-seen order"""
+        metrics = self.evaluator.compute_group_metrics(self.df, 'skin_tone')
+        self.assertEqual(list(metrics), ['light', 'dark'])
+        
+        # light: TP 1, FN 1, TN 1; dark: TP 1, FP 1, TN 1
+        light, dark = metrics['light'], metrics['dark']
+        self.assertEqual(light['sample_size'], 3)
+        self.assertEqual((light['true_positives'], light['false_negatives'], light['true_negatives']), (1, 1, 1))
+        self.assertAlmostEqual(light['accuracy'], 2 / 3)
+        self.assertAlmostEqual(light['precision'], 1.0)
+        self.assertAlmostEqual(light['recall'], 0.5)
+        self.assertAlmostEqual(light['f1_score'], 2 / 3)
+        self.assertAlmostEqual(light['specificity'], 1.0)
+        self.assertAlmostEqual(light['avg_confidence'], (0.9 + 0.8 + 0.5) / 3)
+        self.assertAlmostEqual(dark['precision'], 0.5)
+        self.assertAlmostEqual(dark['positive_rate'], 2 / 3)
+        self.assertAlmostEqual(dark['false_positive_rate'], 0.5)
+        self.assertAlmostEqual(dark['false_negative_rate'], 0.0)
+    
+    def test_float_labels(self):
+        """Test 0.0/1.0 labels (as read from CSV) give the same metrics as ints"""
+        df = self.df.astype({'true_label': float, 'predicted_label': float})
+        self.assertEqual(self.evaluator.compute_group_metrics(df, 'skin_tone'),
+                         self.evaluator.compute_group_metrics(self.df, 'skin_tone'))
+        self.assertEqual(self.evaluator.compute_fairness_metrics(df, 'skin_tone', ['light']),
+                         self.evaluator.compute_fairness_metrics(self.df, 'skin_tone', ['light']))
+        
+        results, _ = self.evaluator.run_complete_evaluation(df, make_plots=False)
+        self.assertAlmostEqual(results['overall_metrics']['accuracy'], 4 / 6)
+    
+    def test_non_binary_labels_rejected(self):
+        """Test labels other than 0/1 raise instead of landing in another cell"""
+        df = self.df.assign(predicted_label=[1, 2, 0, 0, 0, 1])
+        with self.assertRaises(ValueError):
+            self.evaluator.compute_group_metrics(df, 'skin_tone')
+        with self.assertRaises(ValueError):
+            self.evaluator.compute_fairness_metrics(df, 'skin_tone', ['light'])
+        with self.assertRaises(ValueError):
+            self.evaluator.run_complete_evaluation(self.df.assign(true_label=np.nan), make_plots=False)
+    
+    def test_single_class_group(self):
+        """Test a group with only one label gets zeros, not an error"""
+        df = self.df.assign(true_label=0, predicted_label=0)
+        metrics = self.evaluator.compute_group_metrics(df, 'skin_tone')
+        self.assertAlmostEqual(metrics['light']['accuracy'], 1.0)
+        self.assertEqual(metrics['light']['precision'], 0.0)
+        self.assertEqual(metrics['light']['true_negatives'], 3)
+    
+    def test_fairness_metrics(self):
+        """Test unprivileged (dark) minus privileged (light) rates"""
+        metrics = self.evaluator.compute_fairness_metrics(self.df, 'skin_tone', ['light'])
+        
+        # light: positive rate 1/3, TPR 1/2, FPR 0; dark: positive rate 2/3, TPR 1, FPR 1/2
+        self.assertAlmostEqual(metrics['demographic_parity_difference'], 1 / 3)
+        self.assertAlmostEqual(metrics['disparate_impact'], 2.0)
+        self.assertAlmostEqual(metrics['equalized_odds_difference'], 1.0)
+        self.assertAlmostEqual(metrics['equal_opportunity_difference'], 0.5)
+        self.assertEqual(metrics['privileged_group_size'], 3)
+        
+        self.assertEqual(self.evaluator.compute_fairness_metrics(self.df, 'skin_tone', ['light', 'dark']), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+import tempfile
+import shutil
+import os
+
+from ai_model.quick_model import SimpleSkinLesionModel
+from ai_model.model_wrapper import ModelWrapper
+
+
+class ModelPersistenceTestCase(unittest.TestCase):
+    """Tests for saving the model with out-of-band array buffers"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.temp_dir, 'saved_models', 'model.pkl')
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def test_arrays_memory_mapped_on_load(self):
+        """Test arrays round-trip through companion files and load read-only"""
+        model = SimpleSkinLesionModel()
+        model.weights = np.arange(12, dtype=np.float32).reshape(3, 4)
+        model.save_model(self.model_path)
+        self.assertTrue(os.path.exists(self.model_path + '.buf0.npy'))
+        
+        wrapper = ModelWrapper(self.model_path)
+        np.testing.assert_array_equal(wrapper.model.weights, model.weights)
+        self.assertFalse(wrapper.model.weights.flags.writeable)
+        self.assertEqual(wrapper.model.classes, model.classes)
+    
+    def test_resave_drops_stale_buffers(self):
+        """Test saving again removes companion files from an earlier save"""
+        model = SimpleSkinLesionModel()
+        model.weights = np.ones(4)
+        model.save_model(self.model_path)
+        
+        del model.weights
+        model.save_model(self.model_path)
+        self.assertFalse(os.path.exists(self.model_path + '.buf0.npy'))
+        self.assertFalse(hasattr(SimpleSkinLesionModel.load_model(self.model_path), 'weights'))
+    
+    def test_predict_returns_probability_pair(self):
+        """Test predict gives (benign, malignant) and predict_proba the (1, 2) array"""
+        wrapper = ModelWrapper(self.model_path)  # no saved model: fresh rule-based one
+        
+        benign_prob, malignant_prob = wrapper.predict(None, 'melanoma_sample.jpg')
+        self.assertGreater(malignant_prob, benign_prob)
+        self.assertAlmostEqual(benign_prob + malignant_prob, 1.0)
+        
+        proba = wrapper.predict_proba(None, 'nevus_sample.jpg')
+        self.assertEqual(proba.shape, (1, 2))
+        self.assertGreater(proba[0, 0], proba[0, 1])
+
+
+
+class RuleBasedPredictionTestCase(unittest.TestCase):
+    """Tests for filename-indicator predictions"""
+    
+    def test_batch_follows_single_prediction_rules(self):
+        """Test predict_batch scores overlapping indicators the way predict does"""
+        model = SimpleSkinLesionModel()
+        paths = ['scans/melanoma_sample.jpg', 'NEVUS_sample.jpg', 'vascular_sk.png', 'basal_cell_carcinoma.jpg']
+        
+        results = model.predict_batch(paths)
+        self.assertEqual([pred for pred, _ in results], [model.predict(p)[0] for p in paths])
+        
+        # melanoma + mel: 0.6 + 0.2 + noise; vascular + vasc + sk: capped at 0.95
+        self.assertTrue(0.8 <= results[0][1] <= 0.95)
+        self.assertTrue(0.9 <= results[2][1] <= 0.95)
+        
+        for pred, confidence in model.predict_batch(['unknown_lesion.jpg', 'nv_mel.jpg'] * 50):
+            self.assertIn(pred, model.classes)
+            self.assertTrue(0.55 <= confidence <= 0.85)
+        
+        self.assertEqual(model.predict_batch([]), [])
+    
+    def test_seeded_batch_matches_single_predictions(self):
+        """Test a seed makes predict_batch reproducible and equal to predict path by path"""
+        paths = ['melanoma_sample.jpg', 'unknown_lesion.jpg', 'nevus_sample.jpg', 'nv_mel.jpg'] * 10
+        
+        batch = SimpleSkinLesionModel(seed=7).predict_batch(paths)
+        self.assertEqual(SimpleSkinLesionModel(seed=7).predict_batch(paths), batch)
+        
+        model = SimpleSkinLesionModel(seed=7)
+        self.assertEqual([model.predict(p) for p in paths], batch)
+        
+        # The generator state survives a save/load round trip
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model = SimpleSkinLesionModel(seed=7)
+            model.save_model(os.path.join(temp_dir, 'model.pkl'))
+            loaded = SimpleSkinLesionModel.load_model(os.path.join(temp_dir, 'model.pkl'))
+        self.assertEqual(loaded.predict_batch(paths), batch)
+
+
+if __name__ == '__main__':
+    unittest.main()
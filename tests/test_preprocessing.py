@@ -3,6 +3,7 @@ import numpy as np
 import cv2
 import tempfile
 import os
+from unittest import mock
 from PIL import Image
 
 # Import preprocessing functions
@@ -10,7 +11,11 @@ from ai_model.preprocess import (
     resize_image,
     normalize_image, 
     lighting_correction,
-    preprocess_image
+    remove_hair_artifacts,
+    preprocess_image,
+    preprocess_batch,
+    augment_image,
+    load_image_rgb
 )
 
 
@@ -63,6 +68,19 @@ class ImagePreprocessingTestCase(unittest.TestCase):
         resized = resize_image(small_image, size=(224, 224))
         self.assertEqual(resized.shape, (224, 224, 3))
     
+    def test_resize_averages_when_shrinking(self):
+        """Test downsampling averages fine detail instead of aliasing it"""
+        checkerboard = np.indices((448, 448)).sum(axis=0) % 2 * 255
+        checkerboard = np.repeat(checkerboard[..., np.newaxis], 3, axis=2).astype(np.uint8)
+        
+        resized = resize_image(checkerboard, size=(224, 224))
+        self.assertTrue(np.all(np.abs(resized.astype(int) - 128) <= 1))
+        
+        resized = resize_image(checkerboard, size=(224, 224), interpolation=cv2.INTER_LANCZOS4)
+        np.testing.assert_array_equal(
+            resized, cv2.resize(checkerboard, (224, 224), interpolation=cv2.INTER_LANCZOS4)
+        )
+    
     def test_normalize_image_range(self):
         """Test that normalization produces correct value ranges"""
         normalized = normalize_image(self.color_image)
@@ -103,6 +121,18 @@ class ImagePreprocessingTestCase(unittest.TestCase):
         self.assertEqual(corrected.shape, self.grayscale_image.shape)
         self.assertEqual(corrected.dtype, self.grayscale_image.dtype)
     
+    def test_remove_hair_artifacts(self):
+        """Test thin dark lines are filled in and hair-free images come back unchanged"""
+        hairy = self.bright_image.copy()
+        cv2.line(hairy, (20, 30), (180, 170), (30, 20, 20), 2)
+        cleaned = remove_hair_artifacts(hairy)
+        self.assertEqual(cleaned.shape, hairy.shape)
+        self.assertGreater(cleaned[100, 100].mean(), 150)
+        
+        cleaned = remove_hair_artifacts(self.bright_image)
+        np.testing.assert_array_equal(cleaned, self.bright_image)
+        self.assertIsNot(cleaned, self.bright_image)
+    
     def test_complete_preprocessing_pipeline(self):
         """Test the complete preprocessing pipeline"""
         temp_file = self.create_temp_image(self.color_image)
@@ -116,6 +146,45 @@ class ImagePreprocessingTestCase(unittest.TestCase):
         self.assertTrue(np.all(processed >= 0.0))
         self.assertTrue(np.all(processed <= 1.0))
     
+    def test_preprocessing_without_normalization(self):
+        """Test that normalize=False returns the uint8 image before scaling"""
+        temp_file = self.create_temp_image(self.color_image)
+        
+        raw = preprocess_image(temp_file, size=(224, 224), normalize=False)
+        processed = preprocess_image(temp_file, size=(224, 224))
+        
+        self.assertEqual(raw.dtype, np.uint8)
+        np.testing.assert_allclose(raw.astype(np.float32) / 255.0, processed)
+    
+    def test_augment_preserves_input_dtype(self):
+        """Test augmentation returns uint8 for uint8 input and floats for floats"""
+        augmented = augment_image(self.color_image)
+        self.assertEqual(augmented.dtype, np.uint8)
+        self.assertEqual(augmented.shape, self.color_image.shape)
+        
+        augmented = augment_image(normalize_image(self.color_image))
+        self.assertEqual(augmented.dtype, np.float32)
+        self.assertTrue(np.all(augmented <= 1.0))
+    
+    def test_augment_reproducible_with_generator(self):
+        """Test equally seeded generators give identical augmentations"""
+        first = [augment_image(self.color_image, strong=True, rng=np.random.default_rng(7)) for _ in range(2)]
+        np.testing.assert_array_equal(first[0], first[1])
+        
+        rng_a, rng_b = np.random.default_rng(3), np.random.default_rng(3)
+        for _ in range(5):
+            np.testing.assert_array_equal(augment_image(self.color_image, rng=rng_a),
+                                          augment_image(self.color_image, rng=rng_b))
+    
+    def test_augment_leaves_input_unchanged(self):
+        """Test the in-place augmentation steps work on a copy of the input"""
+        original = normalize_image(self.color_image)
+        image = original.copy()
+        for strong in (False, True):
+            for _ in range(10):
+                augment_image(image, strong=strong)
+        np.testing.assert_array_equal(image, original)
+    
     def test_preprocessing_with_different_sizes(self):
         """Test preprocessing with various target sizes"""
         temp_file = self.create_temp_image(self.color_image)
@@ -126,6 +195,35 @@ class ImagePreprocessingTestCase(unittest.TestCase):
             processed = preprocess_image(temp_file, size=size)
             self.assertEqual(processed.shape, (*size, 3))
     
+    def test_exif_rotated_jpeg_same_with_either_decoder(self):
+        """Test an orientation-tagged JPEG loads the same way up with or without libjpeg-turbo"""
+        wide = np.zeros((40, 80, 3), dtype=np.uint8)
+        wide[:, :40] = (255, 0, 0)
+        image = Image.fromarray(wide)
+        exif = image.getexif()
+        exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+        temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
+        temp_file.close()
+        image.save(temp_file.name, exif=exif.tobytes())
+        self.temp_files.append(temp_file.name)
+        
+        # Stand-in for TurboJPEG, which decodes without applying EXIF orientation
+        turbo = mock.Mock()
+        turbo.decode.side_effect = lambda data, pixel_format: cv2.cvtColor(cv2.imdecode(
+            np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+        ), cv2.COLOR_BGR2RGB)
+        
+        opencv = load_image_rgb(temp_file.name)
+        with mock.patch('ai_model.preprocess._turbo_jpeg', turbo), \
+                mock.patch('ai_model.preprocess.TJPF_RGB', 0, create=True):
+            with_turbo = load_image_rgb(temp_file.name)
+            upright = load_image_rgb(self.create_temp_image(self.color_image))
+        
+        self.assertEqual(opencv.shape, (80, 40, 3))
+        np.testing.assert_array_equal(with_turbo, opencv)
+        self.assertEqual(turbo.decode.call_count, 1)  # only the upright file used it
+        self.assertEqual(upright.shape, self.color_image.shape)
+    
     def test_preprocessing_error_handling(self):
         """Test preprocessing error handling"""
         # Test with non-existent file
@@ -166,6 +264,19 @@ class ImagePreprocessingTestCase(unittest.TestCase):
         # All results should be identical
         for i in range(1, len(results)):
             np.testing.assert_array_equal(results[0], results[i])
+    
+    def test_preprocess_batch_matches_single_images(self):
+        """Test batch preprocessing keeps order and reports unreadable files"""
+        paths = [self.create_temp_image(self.color_image), "non_existent_file.jpg",
+                 self.create_temp_image(self.dark_image)]
+        
+        for num_workers in (1, 3):
+            images, failed = preprocess_batch(paths, size=(128, 96), num_workers=num_workers)
+            self.assertEqual(images.shape, (2, 96, 128, 3))
+            self.assertEqual(images.dtype, np.float32)
+            np.testing.assert_array_equal(images[0], preprocess_image(paths[0], size=(128, 96)))
+            np.testing.assert_array_equal(images[1], preprocess_image(paths[2], size=(128, 96)))
+            self.assertEqual([path for path, _ in failed], ["non_existent_file.jpg"])
 
 
 class LightingCorrectionAdvancedTestCase(unittest.TestCase):